@@ -0,0 +1,91 @@
+############################################## Imports ##############################################
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_TOP = 10
+MAX_TOP = 100
+
+# Every route reads the live-state snapshot and the statistics snapshot published by the game loop,
+# and the number of rows asked for (?n=...).
+ROUTES = {
+    '/games': lambda live, stats, n: live,
+    '/players/top': lambda live, stats, n: stats['top_players'][:n],
+    '/questions/viewed': lambda live, stats, n: stats['most_viewed'][:n],
+    '/questions/hardest': lambda live, stats, n: stats['hardest'][:n],
+    '/players/latency': lambda live, stats, n: stats['latency'][:n],
+    '/stats': lambda live, stats, n: stats['counters'],
+}
+
+
+############################################## Request Handler ##############################################
+class AdminRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so dashboards polling often reuse their connection
+    server_version = 'TriviaAdmin/1.0'
+    disable_nagle_algorithm = True  # headers and body go out in separate writes, don't wait for delayed ACKs
+
+    def do_GET(self):
+        """
+        Serve a route as JSON. Responses are encoded once per snapshot and served from the cache until the
+        game loop publishes new snapshots.
+        """
+        url = urlparse(self.path)
+        if url.path not in ROUTES:
+            self.send_json(404, {'error': f'unknown route {url.path}', 'routes': sorted(ROUTES)})
+            return
+        try:
+            n = max(0, min(int(parse_qs(url.query).get('n', [DEFAULT_TOP])[0]), MAX_TOP))
+        except ValueError:
+            self.send_json(400, {'error': 'n must be a number'})
+            return
+        snapshots = self.server.get_snapshots()
+        cache = self.server.cache
+        if cache.get('snapshots') is not snapshots:
+            cache = self.server.cache = {'snapshots': snapshots}
+        key = (url.path, n)
+        body = cache.get(key)
+        if body is None:
+            body = cache[key] = json.dumps(ROUTES[url.path](*snapshots, n)).encode('utf-8')
+        self.send_body(200, body)
+
+    def do_POST(self):
+        """
+        POST /reload reloads the question bank in the background.
+        """
+        if urlparse(self.path).path != '/reload':
+            self.send_json(404, {'error': f'unknown route {self.path}'})
+            return
+        self.server.reload()
+        self.send_json(202, {'reload': 'started'})
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload).encode('utf-8'))
+
+    def send_body(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # queries are far too frequent to log one line each
+
+
+############################################## Server ##############################################
+def start_admin_server(host, port, get_snapshots, reload):
+    """
+    Start the admin API in a background thread.
+    param get_snapshots: returns the current (live state, statistics) snapshots, which must never be changed in
+    place - the game loop publishes new ones instead, so requests never wait for a game lock
+    param reload: called for POST /reload
+    returns the HTTP server
+    """
+    server = ThreadingHTTPServer((host, port), AdminRequestHandler)
+    server.daemon_threads = True
+    server.get_snapshots = get_snapshots
+    server.reload = reload
+    server.cache = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
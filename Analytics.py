@@ -0,0 +1,212 @@
+############################################## Imports ##############################################
+import argparse
+import array
+import json
+import os
+import numpy as np
+import EventLog
+from EventLog import GAME_START, PLAYER_JOIN, QUESTION_SENT, ANSWER_RECEIVED, ROUND_RESOLVED, GAME_END
+from Server import print_colors, print_colors_panda
+
+# Columns written by ingest(), one .npy file each, plus the question and player names in names.json
+ANSWER_COLUMNS = {'answer_game': 'i', 'answer_round': 'i', 'answer_question': 'i', 'answer_player': 'i',
+                  'answer_correct': 'b', 'answer_latency_us': 'q'}
+ROUND_COLUMNS = {'round_game': 'i', 'round_number': 'i', 'round_correct': 'i', 'round_incorrect': 'i'}
+GAME_COLUMNS = {'game_players': 'i', 'game_rounds': 'i', 'game_has_winner': 'b', 'game_duration_us': 'q'}
+LATENCY_BINS_MS = np.arange(0, 10500, 500)
+
+
+############################################## Ingest Functions ##############################################
+def ingest(log_path, out_dir):
+    """
+    Convert an event log into columnar NumPy files.
+    This function walks the event log once and writes one .npy file per column into out_dir, so the report
+    can memory-map the columns instead of parsing the log again. The log is streamed (EventLog.read_events())
+    and the rows of a game are added to the columns in one batch when it ends, so memory holds the columns and
+    one game. Games still running at the end of the log are left out.
+    param log_path: the event log written by the server (rotated files are included)
+    param out_dir: directory for the column files
+    returns the number of answers written
+    """
+    columns = {name: array.array(code) for name, code in {**ANSWER_COLUMNS, **ROUND_COLUMNS, **GAME_COLUMNS}.items()}
+    questions = {}
+    players = {}
+    game = None
+    for event_type, timestamp, fields in EventLog.read_events(log_path):
+        if event_type == GAME_START:
+            # rows of the current game are kept apart until its GAME_END, so unfinished games are dropped
+            game = {'index': len(columns['game_players']), 'started_at': timestamp, 'players': 0, 'rounds': [],
+                    'answer_round': [], 'answer_question': [], 'answer_player': [], 'answer_correct': [],
+                    'answer_latency_us': [], 'question': None, 'round': 0, 'sent_at': timestamp}
+        elif game is None:
+            continue
+        elif event_type == PLAYER_JOIN:
+            game['players'] += 1
+        elif event_type == QUESTION_SENT:
+            game['round'] = fields[0]
+            game['question'] = questions.setdefault(fields[1], len(questions))
+            game['sent_at'] = timestamp
+        elif event_type == ANSWER_RECEIVED and game['question'] is not None:
+            game['answer_round'].append(game['round'])
+            game['answer_question'].append(game['question'])
+            game['answer_player'].append(players.setdefault(fields[0], len(players)))
+            game['answer_correct'].append(fields[2])
+            game['answer_latency_us'].append(timestamp - game['sent_at'])
+        elif event_type == ROUND_RESOLVED:
+            game['rounds'].append((fields[0], fields[1], fields[2]))
+        elif event_type == GAME_END:
+            columns['answer_game'].extend([game['index']] * len(game['answer_round']))
+            for name in ('answer_round', 'answer_question', 'answer_player', 'answer_correct', 'answer_latency_us'):
+                columns[name].extend(game[name])
+            for round_number, correct, incorrect in game['rounds']:
+                columns['round_game'].append(game['index'])
+                columns['round_number'].append(round_number)
+                columns['round_correct'].append(correct)
+                columns['round_incorrect'].append(incorrect)
+            columns['game_players'].append(game['players'])
+            columns['game_rounds'].append(len(game['rounds']))
+            columns['game_has_winner'].append(1 if fields[0] else 0)
+            columns['game_duration_us'].append(timestamp - game['started_at'])
+            game = None
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(out_dir, f'{name}.npy'), np.frombuffer(values, dtype=values.typecode)
+                if len(values) else np.zeros(0, dtype=values.typecode))
+    with open(os.path.join(out_dir, 'names.json'), 'w') as f:
+        json.dump({'questions': list(questions), 'players': list(players)}, f)
+    return len(columns['answer_game'])
+
+
+def load_columns(data_dir):
+    """
+    Memory-map the column files written by ingest().
+    returns a dictionary of column name to array, and the question and player names
+    """
+    columns = {name: np.load(os.path.join(data_dir, f'{name}.npy'), mmap_mode='r')
+               for name in {**ANSWER_COLUMNS, **ROUND_COLUMNS, **GAME_COLUMNS}}
+    with open(os.path.join(data_dir, 'names.json')) as f:
+        names = json.load(f)
+    return columns, names['questions'], names['players']
+
+
+############################################## Analytics Functions ##############################################
+def question_difficulty(columns, n_questions):
+    """
+    Per-question answer counts and difficulty (share of incorrect answers, NaN for unanswered questions).
+    """
+    total = np.bincount(columns['answer_question'], minlength=n_questions)
+    correct = np.bincount(columns['answer_question'], weights=columns['answer_correct'], minlength=n_questions)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        difficulty = 1 - correct / total
+    return total, correct.astype(np.int64), difficulty
+
+
+def latency_distribution(columns):
+    """
+    Answer latency (time from question sent to answer received) percentiles and histogram, in milliseconds.
+    """
+    latency_ms = columns['answer_latency_us'] / 1000
+    if latency_ms.size == 0:
+        return {}, np.zeros(len(LATENCY_BINS_MS) - 1, dtype=np.int64)
+    percentiles = np.percentile(latency_ms, [50, 90, 99])
+    histogram, _ = np.histogram(np.minimum(latency_ms, LATENCY_BINS_MS[-1] - 1), bins=LATENCY_BINS_MS)
+    return {'p50': percentiles[0], 'p90': percentiles[1], 'p99': percentiles[2], 'max': latency_ms.max()}, histogram
+
+
+def player_accuracy(columns, n_players):
+    """
+    Per-player answer counts and accuracy.
+    """
+    total = np.bincount(columns['answer_player'], minlength=n_players)
+    correct = np.bincount(columns['answer_player'], weights=columns['answer_correct'], minlength=n_players)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        accuracy = correct / total
+    return total, accuracy
+
+
+def survival_curve(columns):
+    """
+    Share of all entrants still in the game at the start of each round.
+    Everybody plays round 1, later rounds are played by the players who answered the previous round correctly.
+    returns an array indexed by round number (index 0 is unused)
+    """
+    round_game = np.asarray(columns['round_game'])
+    round_number = np.asarray(columns['round_number'])
+    if round_game.size == 0:
+        return np.zeros(1)
+    previous_correct = np.concatenate(([0], columns['round_correct'][:-1]))
+    alive = np.where(round_number == 1, columns['game_players'][round_game], previous_correct)
+    per_round = np.bincount(round_number, weights=alive)
+    return per_round / max(int(np.sum(columns['game_players'])), 1)
+
+
+def game_length_distribution(columns):
+    """
+    Number of games per game length in rounds, indexed by the number of rounds.
+    """
+    return np.bincount(columns['game_rounds'])
+
+
+############################################## Report Functions ##############################################
+def report(data_dir, top, export):
+    """
+    Compute every metric over the memory-mapped columns, print a summary and optionally export it as JSON.
+    """
+    columns, questions, players = load_columns(data_dir)
+    q_total, q_correct, difficulty = question_difficulty(columns, len(questions))
+    latency, histogram = latency_distribution(columns)
+    p_total, accuracy = player_accuracy(columns, len(players))
+    survival = survival_curve(columns)
+    lengths = game_length_distribution(columns)
+
+    answered = np.flatnonzero(q_total)
+    hardest = answered[np.argsort(-difficulty[answered], kind='stable')][:top]
+    ranked_players = np.lexsort((-p_total, -np.nan_to_num(accuracy)))[:top]
+    print_colors(f'{len(columns["game_players"])} games, {len(columns["round_game"])} rounds, '
+                 f'{len(columns["answer_game"])} answers')
+    print_colors_panda('Hardest questions:\n' + '\n'.join(
+        f'{difficulty[q]:6.1%} wrong of {q_total[q]:>8} | {questions[q]}' for q in hardest))
+    print_colors_panda('Most accurate players:\n' + '\n'.join(
+        f'{accuracy[p]:6.1%} right of {p_total[p]:>8} | {players[p]}' for p in ranked_players))
+    print_colors_panda(f'Answer latency (ms): ' + ', '.join(f'{k} {v:.0f}' for k, v in latency.items()))
+    print_colors_panda('Round survival: ' + ', '.join(f'r{r} {share:.1%}' for r, share in enumerate(survival) if r))
+    print_colors_panda('Game length (rounds: games): ' + ', '.join(f'{r}: {n}' for r, n in enumerate(lengths) if n))
+
+    if export:
+        with open(export, 'w') as f:
+            json.dump({
+                'questions': [{'question': questions[q], 'answers': int(q_total[q]), 'correct': int(q_correct[q]),
+                               'difficulty': float(difficulty[q])} for q in answered],
+                'players': [{'player': players[p], 'answers': int(p_total[p]), 'accuracy': float(accuracy[p])}
+                            for p in np.flatnonzero(p_total)],
+                'latency_ms': {**{k: float(v) for k, v in latency.items()},
+                               'histogram_bins': LATENCY_BINS_MS.tolist(), 'histogram': histogram.tolist()},
+                'survival': survival[1:].tolist(),
+                'game_length': {str(r): int(n) for r, n in enumerate(lengths) if n},
+            }, f, indent=1)
+        print_colors(f'Exported analytics to {export}')
+
+
+############################################## Main Function ##############################################
+def main():
+    parser = argparse.ArgumentParser(description='Offline analytics over the server event log.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = commands.add_parser('ingest', help='convert an event log into columnar NumPy files')
+    ingest_parser.add_argument('log', help='event log file written by the server')
+    ingest_parser.add_argument('--data', default='analytics', help='directory for the column files')
+    report_parser = commands.add_parser('report', help='compute the analytics over the column files')
+    report_parser.add_argument('--data', default='analytics', help='directory with the column files')
+    report_parser.add_argument('--top', type=int, default=10, help='rows to show in the rankings')
+    report_parser.add_argument('--export', help='write the results to this JSON file for dashboards')
+    args = parser.parse_args()
+
+    if args.command == 'ingest':
+        answers = ingest(args.log, args.data)
+        print_colors(f'Wrote {answers} answers to {args.data}')
+    else:
+        report(args.data, args.top, args.export)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+############################################## Imports ##############################################
+import argparse
+import os
+import random
+import socket
+import statistics
+import time
+import Discovery
+import Server
+import Transport
+from Server import print_colors, print_colors_panda
+
+
+############################################## Payload Benchmark ##############################################
+class NullConnection:
+    def __init__(self):
+        """
+        A connection that accepts every send, so the benchmark measures building and encoding the messages only.
+        """
+        self.sent = 0
+
+    def send(self, data):
+        self.sent += len(data)
+        return len(data)
+
+
+def legacy_round(connections, names, question, round_number, answers):
+    """
+    One round as the server sent it before the payloads were cached: the message strings are built with +=
+    and every broadcast encodes them again for every recipient.
+    """
+    team_msg = f'Round {round_number}, played by '
+    i = 1
+    for name in names:
+        if i == 1:
+            team_msg += f'{name} '
+            i += 1
+        elif i < len(names):
+            team_msg += f'and {name}'
+            i += 1
+        else:
+            team_msg += f'and {name}:\n'
+    team_msg += f'\nTrue or false: {question}'
+    for conn in connections:
+        conn.send(Server.timer_line(Server.CON_NAME[conn]) + team_msg.encode('utf-8'))
+    message = ''
+    for answer in answers.keys():
+        for name in answers[answer]:
+            if answer == 'True':
+                message += f'{name} Is Correct!\n'
+            else:
+                message += f'{name} Is InCorrect!\n'
+        for conn in connections:
+            conn.send(message.encode('utf-8'))
+        message = ''
+
+
+def cached_round(connections, names, question, round_number, answers):
+    """
+    One round as the server sends it now: each payload is built once in one pass and the bytes are shared by
+    every recipient.
+    """
+    Server.broadcast_message(Server.round_payload(round_number, names, question), timed=True,
+                             connections=connections)
+    Server.broadcast_message(Server.results_payload(answers), connections=connections)
+
+
+def bench_payloads(players, rounds):
+    """
+    Server CPU time per round (question and results broadcast to every player) of the legacy and the cached
+    message building, measured with the thread's CPU clock.
+    returns a dictionary of variant name to microseconds per round
+    """
+    connections = [NullConnection() for _ in range(players)]
+    names = [f'player{number}_127.0.0.1' for number in range(players)]
+    Server.CONNECTIONS = connections
+    Server.CON_NAME = dict(zip(connections, names))
+    answers = {'True': names[::2], 'False': names[1::2]}
+    questions = list(Server.olympics_questions)
+    results = {}
+    for variant, play_round in (('legacy', legacy_round), ('cached', cached_round)):
+        started_at = time.thread_time_ns()
+        for round_number in range(rounds):
+            play_round(connections, names, random.choice(questions), round_number + 1, answers)
+        results[variant] = (time.thread_time_ns() - started_at) / rounds / 1000
+    return results
+
+
+############################################## Discovery Benchmark ##############################################
+def bench_discovery(clients, offers):
+    """
+    Offer delivery to many listeners of one host: one becomes the hub, the others subscribe to it.
+    A private port and hub name are used, so running clients aren't disturbed.
+    returns the milliseconds until every listener had each offer, and the number of offers missed by any listener
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    hub_name = f'\0trivia-discovery-bench-{os.getpid()}'
+    listeners = [Discovery.OfferListener(port, None, hub_name) for _ in range(clients)]
+    time.sleep(0.2)  # let the hub accept its subscribers
+    delivery_ms = []
+    missed = 0
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+        for number in range(offers):
+            sent_at = time.perf_counter()
+            sender.sendto(Discovery.build_offer(f'Bench{number}', 1024 + number), ('127.0.0.1', port))
+            received = [listener.wait_offer(timeout=1) for listener in listeners]
+            delivery_ms.append((time.perf_counter() - sent_at) * 1000)
+            missed += sum(1 for offer in received if offer is None or offer[1] != 1024 + number)
+    return delivery_ms, missed
+
+
+############################################## Latency Benchmark ##############################################
+def bench_latency(profile, rounds):
+    """
+    Answer latency over a loopback connection with both ends set to a transport profile.
+    Every round the server sends the results of the last round and the next question as two messages, as
+    end_round() does, and the client answers as soon as the question is complete.
+    returns the milliseconds from the server's first send until it received the answer, per round
+    """
+    results = Server.results_payload({'True': ['player1_127.0.0.1'], 'False': ['player2_127.0.0.1']})
+    question = Server.round_payload(2, ['player1_127.0.0.1'], random.choice(list(Server.olympics_questions)))
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as listener:
+        Transport.apply_profile(listener, profile)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        Transport.apply_profile(client, profile)
+        client.connect(listener.getsockname())
+        server, _ = listener.accept()
+        Transport.apply_profile(server, profile)
+    latency_ms = []
+    with client, server:
+        for _ in range(rounds):
+            sent_at = time.perf_counter()
+            server.send(results)
+            server.send(question)
+            received = 0
+            while received < len(results) + len(question):
+                received += len(client.recv(4096))
+            client.send(b'T')
+            server.recv(1024)
+            latency_ms.append((time.perf_counter() - sent_at) * 1000)
+    return latency_ms
+
+
+############################################## Main Function ##############################################
+def main():
+    parser = argparse.ArgumentParser(description='Server microbenchmarks.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    payloads_parser = commands.add_parser('payloads', help='server CPU per round of building and sending messages')
+    payloads_parser.add_argument('--players', type=int, nargs='+', default=[10, 100, 1000],
+                                 help='players per round')
+    payloads_parser.add_argument('--rounds', type=int, default=200, help='rounds per measurement')
+    discovery_parser = commands.add_parser('discovery', help='offer delivery to many clients of one host')
+    discovery_parser.add_argument('--clients', type=int, default=1000, help='offer listeners')
+    discovery_parser.add_argument('--offers', type=int, default=20, help='offers to send')
+    latency_parser = commands.add_parser('latency', help='answer latency per transport profile')
+    latency_parser.add_argument('--profiles', nargs='+', default=list(Transport.PROFILES),
+                                choices=list(Transport.PROFILES), help='profiles to measure')
+    latency_parser.add_argument('--rounds', type=int, default=200, help='rounds per profile')
+    args = parser.parse_args()
+
+    if args.command == 'payloads':
+        lines = []
+        for players in args.players:
+            results = bench_payloads(players, args.rounds)
+            lines.append(f'{players:>6} players: legacy {results["legacy"]:10.1f} us/round, '
+                         f'cached {results["cached"]:10.1f} us/round, '
+                         f'{results["legacy"] / results["cached"]:.2f}x')
+        print_colors_panda('Server CPU per round:\n' + '\n'.join(lines))
+        print_colors(f'{args.rounds} rounds per measurement')
+    elif args.command == 'discovery':
+        delivery_ms, missed = bench_discovery(args.clients, args.offers)
+        print_colors(f'{args.offers} offers to {args.clients} listeners: all delivered in '
+                     f'{statistics.median(delivery_ms):.2f} ms (median), {max(delivery_ms):.2f} ms (max), '
+                     f'{missed} missed')
+    elif args.command == 'latency':
+        lines = []
+        for profile in args.profiles:
+            latency_ms = sorted(bench_latency(profile, args.rounds))
+            lines.append(f'{profile:>15}: median {statistics.median(latency_ms):8.3f} ms, '
+                         f'p99 {latency_ms[int(len(latency_ms) * 0.99) - 1]:8.3f} ms, max {latency_ms[-1]:8.3f} ms')
+        print_colors_panda('Answer latency over loopback:\n' + '\n'.join(lines))
+        print_colors(f'{args.rounds} rounds per profile')
+
+
+if __name__ == '__main__':
+    main()
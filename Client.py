@@ -1,10 +1,16 @@
 import socket
-import select
 import threading
+import random
+import time
 import tkinter as tk
 import regex as re
+import Discovery
+import Transport
 
 UDP_PORT = 13117
+MAX_BACKOFF = 60  # longest wait, in seconds, after the server rejected us as full
+TRANSPORT_PROFILE = 'lan'  # socket options of the server connection, a profile name in Transport.PROFILES
+FULL_REJECTIONS = 0  # consecutive 'Server Full!' rejections, drives the exponential backoff
 
 class TriviaClient:
     def __init__(self):
@@ -13,14 +19,13 @@ class TriviaClient:
 
         """
         self.connected = False  # Flag to indicate whether connected to a server
-        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.udp_socket.bind(('', UDP_PORT))
+        self.discovery = Discovery.shared_listener(UDP_PORT)  # offers, from the one UDP listener of this host
         self.tcp_socket = None
         self.stop = False
         self.root = None  # Will be initialized later
         self.timer_app = None  # TimerApp instance will be created later
         self.time_up_event = threading.Event()  # Event to signal when time is up
+        self.answer_time = 10  # Seconds left to answer the current question, from the server's '#TIMER' line
 
     def print_colors(self, message, flag):
         """
@@ -41,14 +46,8 @@ class TriviaClient:
         """
         self.print_colors('Client started, listening for offer requests...', 1)
         while not self.connected:  # Listen until connected to a server
-            ready = select.select([self.udp_socket], [], [], 1)  # Non-blocking check for UDP packet
-            if ready[0]:
-                data, addr = self.udp_socket.recvfrom(1024)
-                # Process UDP packet
-                if data.startswith(b'\xab\xcd\xdc\xba\x02'):
-                    server_name = data[5:37].strip().decode()
-                    server_port = int.from_bytes(data[37:39], 'big')
-                    self.tcp_client(addr[0], server_port, server_name, addr)
+            server_ip, server_port, server_name = self.discovery.wait_offer()  # blocks until a valid offer arrives
+            self.tcp_client(server_ip, server_port, server_name, (server_ip, UDP_PORT))
 
     def tcp_client(self, server_ip, server_port, server_name, addr):
         """
@@ -63,23 +62,30 @@ class TriviaClient:
         :param server_name:The name of the server.
         :param addr:ip,port of the server.
         """
+        global FULL_REJECTIONS
+
         try:
-            self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.tcp_socket.connect((server_ip, server_port))
             self.print_colors(
                 f'Received offer from server "{server_name}" at address {addr[0]}, attempting to connect...', 1)
+            # ask before connecting, the server only waits a few seconds for the name
             name = input("Please enter your name: ")
+            self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            Transport.apply_profile(self.tcp_socket, TRANSPORT_PROFILE)  # before connect(), for the buffer sizes
+            self.tcp_socket.connect((server_ip, server_port))
             self.tcp_socket.send(name.encode('utf-8'))
             self.connected = True  # Set connected flag to True
             while self.connected:
                 data = self.tcp_socket.recv(1024)
                 if not data:
                     break
+                data = self.handle_control_lines(data.decode('utf-8'), time.time())
+                if not data.strip():
+                    continue  # only control lines
                 # If the server sends a message that starts with 'Welcome' or 'Round', show the timer window
                 pattern1 = r'(.*)(Question:.+)'
                 pattern2 = r'(.*)(True or false:.+)'
-                match1 = re.search(pattern1, data.decode('utf-8'), re.MULTILINE | re.DOTALL)
-                match2 = re.search(pattern2, data.decode('utf-8'), re.MULTILINE | re.DOTALL)
+                match1 = re.search(pattern1, data, re.MULTILINE | re.DOTALL)
+                match2 = re.search(pattern2, data, re.MULTILINE | re.DOTALL)
                 if match1:
                     sentence_before_question = match1.group(1).strip()
                     self.print_colors(sentence_before_question, 2)
@@ -91,8 +97,14 @@ class TriviaClient:
                     sentence_with_question = match2.group(2).strip()
                     self.print_colors(sentence_with_question, 3)
                 else:
-                    self.print_colors(data.decode('utf-8'), 2)
-                data = data.decode('utf-8')
+                    self.print_colors(data, 2)
+                if 'Server Full!' in data:
+                    self.tcp_socket.close()
+                    self.connected = False
+                    self.back_off(data)
+                    break
+                if 'Welcome' in data:
+                    FULL_REJECTIONS = 0
                 if 'Welcome' in data or 'Round' in data:
                     threading.Thread(target=self.set_countdown).start()  # Start the countdown in a new thread
                     self.get_user_answer_input()
@@ -109,6 +121,50 @@ class TriviaClient:
             self.print_colors("Server disconnected, listening for offer requests..", 1)
             self.__init__()  # Reset the client after error
 
+    def handle_control_lines(self, data, received_at):
+        """
+    Answer the server's control lines and return the rest of the message.
+    '#PING <server time>' is answered right away with '#PONG <server time> <received at> <sent at>', so the
+    server can measure our round-trip time and clock offset and give slow connections more time to answer.
+    '#TIMER <seconds>' tells how long we have left to answer the next question, counted from when it reaches us.
+
+        :param data: The decoded message received from the server.
+        :param received_at: time.time() when the message was received.
+        :return: The message without the control lines.
+        """
+        if '#' not in data:
+            return data
+        text = []
+        for line in data.split('\n'):
+            if line.startswith('#PING'):
+                sent_at = line.split()[1] if len(line.split()) > 1 else '0'
+                self.tcp_socket.send(f'#PONG {sent_at} {received_at:.6f} {time.time():.6f}\n'.encode('utf-8'))
+            elif line.startswith('#TIMER'):
+                try:
+                    self.answer_time = float(line.split()[1])
+                except (IndexError, ValueError):
+                    pass
+            elif not line.startswith('#'):
+                text.append(line)
+        return '\n'.join(text)
+
+    def back_off(self, data):
+        """
+        Wait before listening for offers again after the server rejected us as full.
+        The wait starts at the server's retry hint and doubles on every consecutive rejection (up to
+        MAX_BACKOFF), with random jitter so rejected clients don't all come back at the same moment.
+        :param data: The rejection message received from the server.
+        """
+        global FULL_REJECTIONS
+
+        match = re.search(r'Try again in (\d+) seconds', data)
+        retry_after = int(match.group(1)) if match else 5
+        delay = min(retry_after * 2 ** FULL_REJECTIONS, MAX_BACKOFF)
+        delay = random.uniform(delay / 2, delay)
+        FULL_REJECTIONS += 1
+        self.print_colors(f'Server is full, trying again in {delay:.1f} seconds...', 1)
+        time.sleep(delay)
+
     def get_user_answer_input(self):
         """
         Get user's answer input for a question and send it to the server.
@@ -131,18 +187,22 @@ class TriviaClient:
         """
         self.root = tk.Tk()
         self.root.title("Countdown Timer")
-        self.timer_app = TimerApp(self.root, self.time_up_event)
+        self.timer_app = TimerApp(self.root, self.time_up_event, self.answer_time)
         self.root.mainloop()  # Start the main loop for the timer app
+        self.root.destroy()  # quit() only stops the main loop, free the window and its Tcl interpreter
+        self.root = None
+        self.timer_app = None
 
 class TimerApp:
-    def __init__(self, master, time_up_event):
+    def __init__(self, master, time_up_event, remaining_time=10):
         """
         Initialize TimerApp instance.
+        :param remaining_time: Seconds left to answer, as sent by the server.
         """
         self.master = master
         self.master.title("Countdown Timer")
         self.master.geometry("250x100")
-        self.remaining_time = 10  # Initial remaining time in seconds
+        self.remaining_time = max(round(remaining_time), 1)  # Initial remaining time in seconds
         self.label = tk.Label(self.master, text=f"Time remaining: {self.remaining_time} seconds",
                                 font=("Helvetica", 10, "bold"))
         self.label.pack(pady=20, expand=True)
@@ -184,7 +244,7 @@ class TimerApp:
         Close the timer window.
 
         """
-        self.master.quit()  # Destroy the Tkinter root window
+        self.master.quit()  # Stop the main loop, set_countdown() destroys the window
 
 def main():
     client = TriviaClient()
@@ -0,0 +1,192 @@
+############################################## Imports ##############################################
+import collections
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+
+UDP_PORT = 13117
+MAGIC_COOKIE = b'\xab\xcd\xdc\xba'
+OFFER_MESSAGE_TYPE = 0x02
+MULTICAST_GROUP = None  # e.g. '239.255.13.117' to also send and receive offers on this multicast group
+MAX_OFFER_AGE = 2  # seconds after which an offer is too old to act on (the lobby may have closed meanwhile)
+QUEUED_OFFERS = 64  # offers kept for the hub's own process while it isn't listening
+# offer packet: magic cookie, message type, server name (padded to 32 bytes), TCP port
+OFFER = struct.Struct('!4sB32sH')
+# what the hub sends its subscribers: server address, time.monotonic() the hub received the offer, the offer
+FANOUT = struct.Struct('!4sd' + OFFER.format.lstrip('!'))
+# Linux abstract socket names need no file and disappear with the process that bound them
+ABSTRACT_SOCKETS = sys.platform.startswith('linux')
+
+
+############################################## Offer Packets ##############################################
+def build_offer(server_name, tcp_port):
+    """
+    The offer packet a server broadcasts. The name is padded with spaces, as older clients expect.
+    """
+    return OFFER.pack(MAGIC_COOKIE, OFFER_MESSAGE_TYPE, server_name.encode('utf-8')[:32].ljust(32), tcp_port)
+
+
+def parse_offer(data):
+    """
+    Validate and parse an offer packet.
+    returns (server name, TCP port), or None if the packet isn't a valid offer
+    """
+    if len(data) != OFFER.size:
+        return None
+    cookie, message_type, name, port = OFFER.unpack(data)
+    if cookie != MAGIC_COOKIE or message_type != OFFER_MESSAGE_TYPE or port == 0:
+        return None
+    try:
+        return name.rstrip(b'\0 ').decode('utf-8'), port
+    except UnicodeDecodeError:
+        return None
+
+
+############################################## Offer Listener ##############################################
+class OfferListener:
+    def __init__(self, port=UDP_PORT, group=MULTICAST_GROUP, hub_name=None):
+        """
+        Receive server offers, sharing one UDP listener among all the clients of this host.
+        The first listener on the host becomes the hub: it binds the UDP port (and joins the multicast group) and
+        forwards every valid offer to the other listeners, which subscribe to it over a local socket. When the
+        hub's process exits its subscribers elect a new hub. Where abstract local sockets don't exist (not Linux),
+        every listener binds the UDP port itself.
+        """
+        self.port = port
+        self.group = group
+        self.hub_name = hub_name or f'\0trivia-discovery-{port}'
+        self.subscription = None  # connection to the hub, when another process is the hub
+        self.offers = collections.deque(maxlen=QUEUED_OFFERS)  # offers for this listener, when it is the hub
+        self.offers_ready = threading.Condition()
+        self.elect()
+
+    def elect(self):
+        """
+        Become the hub of this host, or subscribe to the hub if there is one.
+        """
+        if not ABSTRACT_SOCKETS:
+            self.start_hub(None)
+            return
+        while True:
+            hub = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            try:
+                hub.bind(self.hub_name)
+            except OSError:
+                hub.close()
+            else:
+                hub.listen(socket.SOMAXCONN)
+                self.start_hub(hub)
+                return
+            subscription = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            try:
+                subscription.connect(self.hub_name)
+            except OSError:
+                subscription.close()
+                time.sleep(0.05)  # the hub is shutting down, elect again
+                continue
+            self.subscription = subscription
+            return
+
+    def start_hub(self, hub):
+        """
+        Bind the UDP port and forward offers in a background thread.
+        param hub: the bound local socket subscribers connect to, None to only receive offers for this listener
+        """
+        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        udp_socket.bind(('', self.port))
+        if self.group is not None:
+            membership = struct.pack('4s4s', socket.inet_aton(self.group), socket.inet_aton('0.0.0.0'))
+            udp_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        threading.Thread(target=self.run_hub, args=(udp_socket, hub), daemon=True).start()
+
+    def run_hub(self, udp_socket, hub):
+        """
+        Receive offers and forward them to every subscriber.
+        Subscribers are never waited for: one whose buffer is full misses the offer (it isn't listening for
+        offers, and the server repeats its offer every second anyway), one that closed its connection is dropped.
+        """
+        subscribers = set()
+        with selectors.DefaultSelector() as selector:
+            selector.register(udp_socket, selectors.EVENT_READ)
+            if hub is not None:
+                selector.register(hub, selectors.EVENT_READ)
+            while True:
+                for key, _ in selector.select():
+                    if key.fileobj is hub:
+                        subscriber, _ = hub.accept()
+                        subscriber.setblocking(False)
+                        subscribers.add(subscriber)
+                        selector.register(subscriber, selectors.EVENT_READ)
+                    elif key.fileobj is udp_socket:
+                        data, addr = udp_socket.recvfrom(1024)
+                        offer = parse_offer(data)
+                        if offer is None:
+                            continue
+                        received_at = time.monotonic()
+                        with self.offers_ready:
+                            self.offers.append((addr[0], offer[1], offer[0], received_at))
+                            self.offers_ready.notify()
+                        record = FANOUT.pack(socket.inet_aton(addr[0]), received_at, *OFFER.unpack(data))
+                        for subscriber in list(subscribers):
+                            try:
+                                subscriber.send(record)
+                            except BlockingIOError:
+                                pass
+                            except OSError:
+                                subscribers.discard(subscriber)
+                                selector.unregister(subscriber)
+                                subscriber.close()
+                    else:  # subscribers never send, so this is a closed connection
+                        selector.unregister(key.fileobj)
+                        subscribers.discard(key.fileobj)
+                        key.fileobj.close()
+
+    def wait_offer(self, timeout=None):
+        """
+        Block until a fresh offer arrives (offers older than MAX_OFFER_AGE seconds are skipped).
+        returns (server IP address, TCP port, server name), or None when the timeout passed
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if self.subscription is None:
+                with self.offers_ready:
+                    if not self.offers and not self.offers_ready.wait_for(lambda: self.offers, remaining):
+                        return None
+                    server_ip, port, name, received_at = self.offers.popleft()
+            else:
+                self.subscription.settimeout(remaining)
+                try:
+                    record = self.subscription.recv(FANOUT.size)
+                except socket.timeout:
+                    return None
+                except OSError:
+                    record = b''
+                if not record:  # the hub exited
+                    self.subscription.close()
+                    self.subscription = None
+                    self.elect()
+                    continue
+                address, received_at, *offer = FANOUT.unpack(record)
+                name, port = parse_offer(OFFER.pack(*offer))
+                server_ip = socket.inet_ntoa(address)
+            if time.monotonic() - received_at <= MAX_OFFER_AGE:
+                return server_ip, port, name
+
+
+LISTENER = None
+
+
+def shared_listener(port=UDP_PORT):
+    """
+    The offer listener of this process, created on first use and kept while the client reconnects.
+    """
+    global LISTENER
+
+    if LISTENER is None:
+        LISTENER = OfferListener(port)
+    return LISTENER
@@ -0,0 +1,206 @@
+############################################## Imports ##############################################
+import os
+import struct
+import threading
+import time
+
+############################################## Event Types ##############################################
+# Every record on disk is:
+#   varint body length | event type (1 byte) | timestamp in microseconds (8 bytes, big endian) | fields
+# Integers are written as varints, booleans as one byte and strings as a varint length followed by UTF-8 bytes.
+GAME_START = 1  # game id
+PLAYER_JOIN = 2  # player name
+QUESTION_SENT = 3  # round, question
+ANSWER_RECEIVED = 4  # player name, answer, answer was correct
+ROUND_RESOLVED = 5  # round, number of correct answers, number of incorrect answers
+GAME_END = 6  # winner ('' when there is no winner)
+
+EVENT_NAMES = {GAME_START: 'game_start', PLAYER_JOIN: 'player_join', QUESTION_SENT: 'question_sent',
+               ANSWER_RECEIVED: 'answer_received', ROUND_RESOLVED: 'round_resolved', GAME_END: 'game_end'}
+EVENT_FIELDS = {GAME_START: (int,), PLAYER_JOIN: (str,), QUESTION_SENT: (int, str),
+                ANSWER_RECEIVED: (str, bool, bool), ROUND_RESOLVED: (int, int, int), GAME_END: (str,)}
+
+HEADER = struct.Struct('>BQ')
+READ_CHUNK = 1024 * 1024  # bytes read_events() reads at a time, so logs of any size are read in constant memory
+
+
+############################################## Encoding Functions ##############################################
+def encode_varint(value):
+    """
+    Encode a non-negative integer as a LEB128 varint.
+    """
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(data, pos):
+    """
+    Decode a LEB128 varint from data starting at pos.
+    returns the decoded value and the position right after it.
+    """
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def encode_record(event_type, timestamp_us, fields):
+    """
+    Encode one event as a length-prefixed record.
+    """
+    body = bytearray(HEADER.pack(event_type, timestamp_us))
+    for kind, value in zip(EVENT_FIELDS[event_type], fields):
+        if kind is bool:
+            body.append(1 if value else 0)
+        elif kind is int:
+            body += encode_varint(value)
+        else:
+            raw = value.encode('utf-8')
+            body += encode_varint(len(raw))
+            body += raw
+    return encode_varint(len(body)) + bytes(body)
+
+
+def decode_body(body):
+    """
+    Decode the body of one record.
+    returns (event_type, timestamp_us, fields)
+    """
+    event_type, timestamp_us = HEADER.unpack_from(body, 0)
+    pos = HEADER.size
+    fields = []
+    for kind in EVENT_FIELDS.get(event_type, ()):
+        if kind is bool:
+            fields.append(bool(body[pos]))
+            pos += 1
+        elif kind is int:
+            value, pos = decode_varint(body, pos)
+            fields.append(value)
+        else:
+            length, pos = decode_varint(body, pos)
+            fields.append(body[pos:pos + length].decode('utf-8'))
+            pos += length
+    return event_type, timestamp_us, tuple(fields)
+
+
+############################################## Writer ##############################################
+class EventLog:
+    def __init__(self, path, max_bytes=16 * 1024 * 1024, backups=5):
+        """
+        Open an append-only event log.
+        When the file grows past max_bytes it is rotated to path.1 (path.1 to path.2 and so on), keeping
+        at most `backups` old files.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.file = open(self.path, 'ab')
+        self.size = self.file.tell()
+
+    def write(self, event_type, *fields):
+        """
+        Append one event, stamped with the current time.
+        """
+        record = encode_record(event_type, time.time_ns() // 1000, fields)
+        with self.lock:
+            if self.size + len(record) > self.max_bytes and self.size > 0:
+                self.rotate()
+            self.file.write(record)
+            self.size += len(record)
+
+    def write_many(self, events):
+        """
+        Append several events at once, given as (event type, timestamp in microseconds, fields) tuples, so no other
+        thread's events end up between them.
+        """
+        records = b''.join(encode_record(event_type, timestamp, fields) for event_type, timestamp, fields in events)
+        with self.lock:
+            if self.size + len(records) > self.max_bytes and self.size > 0:
+                self.rotate()
+            self.file.write(records)
+            self.size += len(records)
+
+    def flush(self):
+        """
+        Push buffered records to the operating system.
+        """
+        with self.lock:
+            self.file.flush()
+
+    def rotate(self):
+        """
+        Rotate the log files, caller must hold the lock.
+        """
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{index}'):
+                os.replace(f'{self.path}.{index}', f'{self.path}.{index + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, 'ab')
+        self.size = 0
+
+    def close(self):
+        """
+        Flush and close the log.
+        """
+        with self.lock:
+            self.file.close()
+
+
+############################################## Reader ##############################################
+def log_files(path):
+    """
+    Return the existing files of a rotated log, oldest first.
+    """
+    files = []
+    index = 1
+    while os.path.exists(f'{path}.{index}'):
+        files.append(f'{path}.{index}')
+        index += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def read_events(path):
+    """
+    Yield (event_type, timestamp_us, fields) for every record of a log and its rotated files, oldest first.
+    The files are read READ_CHUNK bytes at a time; a record cut short at the end of a file (the server stopped
+    mid-write) ends that file.
+    """
+    for file_name in log_files(path):
+        with open(file_name, 'rb') as f:
+            data = b''
+            while True:
+                chunk = f.read(READ_CHUNK)
+                if not chunk:
+                    break
+                data += chunk
+                pos = 0
+                while pos < len(data):
+                    try:
+                        length, start = decode_varint(data, pos)
+                    except IndexError:
+                        break
+                    if start + length > len(data):
+                        break  # the rest of the record is in the next chunk
+                    yield decode_body(data[start:start + length])
+                    pos = start + length
+                data = data[pos:]
@@ -0,0 +1,157 @@
+############################################## Imports ##############################################
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+
+
+############################################## Handlers & Filters ##############################################
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue, drop_policy):
+        """
+        Queue handler that never blocks the thread that logs.
+        When the queue is full the newest record is dropped ('newest'), or the oldest queued record makes room
+        for it ('oldest'). Dropped records are counted in self.dropped.
+        """
+        super().__init__(log_queue)
+        self.drop_policy = drop_policy
+        self.dropped = 0
+
+    def prepare(self, record):
+        """
+        Render the message text now (its arguments may change later), leave the formatting to the writer thread.
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.drop_policy == 'oldest':
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+        self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate):
+        """
+        Keep only a `rate` share of the records below WARNING, warnings and errors always pass.
+        """
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+############################################## Formatters ##############################################
+def record_fields(record):
+    """
+    The structured fields attached to a record with extra={'fields': {...}}.
+    """
+    return getattr(record, 'fields', None) or {}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {'ts': round(record.created, 6), 'level': record.levelname.lower(), 'thread': record.threadName,
+                 'msg': record.getMessage(), **record_fields(record)}
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LogfmtFormatter(logging.Formatter):
+    def format(self, record):
+        pairs = {'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+                 'level': record.levelname.lower(), 'thread': record.threadName, 'msg': record.getMessage(),
+                 **record_fields(record)}
+        return ' '.join(f'{key}={self.quote(value)}' for key, value in pairs.items())
+
+    @staticmethod
+    def quote(value):
+        text = str(value)
+        if text and not any(char in text for char in ' ="\n'):
+            return text
+        return json.dumps(text, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        """
+        The colored output for interactive terminals: the message in the record's color (extra={'color': ...}),
+        followed by a blank line for multi-line blocks such as statistics tables (extra={'block': True}).
+        """
+        text = record.getMessage()
+        fields = record_fields(record)
+        if fields:
+            text += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        color = getattr(record, 'color', None)
+        if color:
+            text = f'{color}{text}\033[0m'
+        if getattr(record, 'block', False):
+            text += '\n\n'
+        return text
+
+
+############################################## Setup ##############################################
+LISTENERS = {}
+
+
+def setup_logging(logger, level='INFO', fmt='json', sample_rate=1.0, queue_size=10000, drop_policy='newest',
+                  stream=None):
+    """
+    Send a logger's records through a bounded queue to a background writer thread.
+    Colored console output is used when the stream is a terminal, otherwise one `fmt` ('json' or 'logfmt')
+    line per record. Calling it again replaces the previous setup of the logger.
+    returns the queue handler, whose `dropped` attribute counts records lost to a full queue
+    """
+    stream = stream or sys.stdout
+    if logger.name in LISTENERS:
+        LISTENERS.pop(logger.name).stop()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    if stream.isatty():
+        formatter = ConsoleFormatter()
+    elif fmt == 'logfmt':
+        formatter = LogfmtFormatter()
+    else:
+        formatter = JsonFormatter()
+    writer = logging.StreamHandler(stream)
+    writer.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = DroppingQueueHandler(log_queue, drop_policy)
+    handler.addFilter(SamplingFilter(sample_rate))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, writer)
+    listener.start()
+    LISTENERS[logger.name] = listener
+    return handler
+
+
+@atexit.register
+def stop_listeners():
+    """
+    Write out the records still queued when the program exits.
+    """
+    for listener in LISTENERS.values():
+        try:
+            listener.stop()
+        except queue.Full:
+            pass
+    LISTENERS.clear()
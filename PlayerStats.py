@@ -0,0 +1,95 @@
+############################################## Imports ##############################################
+import heapq
+import sqlite3
+import threading
+
+
+############################################## Heavy Hitters ##############################################
+class SpaceSaving:
+    def __init__(self, capacity):
+        """
+        Space-Saving heavy-hitters sketch.
+        Keeps at most `capacity` counters. A key that isn't tracked takes over the smallest counter and inherits
+        its count as the error bound, so every key whose true count is above total / capacity is guaranteed to be
+        tracked and no count is ever underestimated.
+        """
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.heap = []  # (count, key), may hold stale entries, fixed lazily in evict()
+
+    def add(self, key, count=1):
+        """
+        Count `count` more occurrences of key.
+        """
+        if key in self.counts:
+            self.counts[key] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+        else:
+            smallest, smallest_count = self.evict()
+            self.counts[key] = smallest_count + count
+            self.errors[key] = smallest_count
+        heapq.heappush(self.heap, (self.counts[key], key))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(value, tracked) for tracked, value in self.counts.items()]
+            heapq.heapify(self.heap)
+
+    def evict(self):
+        """
+        Drop the key with the smallest counter.
+        returns the dropped key and its count
+        """
+        while True:
+            count, key = heapq.heappop(self.heap)
+            if self.counts.get(key) == count:
+                del self.counts[key]
+                del self.errors[key]
+                return key, count
+
+    def top(self, n):
+        """
+        The n keys with the highest counts, as (key, count, error) tuples, highest first.
+        The true count of each key is between count - error and count.
+        """
+        keys = heapq.nlargest(n, self.counts, key=self.counts.get)
+        return [(key, self.counts[key], self.errors[key]) for key in keys]
+
+
+############################################## Durable Store ##############################################
+class PlayerStore:
+    def __init__(self, path):
+        """
+        SQLite store for player records evicted from memory.
+        """
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS players '
+                        '(name TEXT PRIMARY KEY, games_played INTEGER, games_won INTEGER)')
+
+    def load(self, name):
+        """
+        Return the stored record of a player, or None if the player isn't stored.
+        """
+        with self.lock:
+            row = self.db.execute('SELECT games_played, games_won FROM players WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        return {"games_played": row[0], "games_won": row[1], "percentage_of_wins": row[1] / row[0] * 100}
+
+    def save(self, records):
+        """
+        Store the records of several players, given as (name, record) pairs, in one transaction.
+        """
+        with self.lock, self.db:
+            self.db.executemany('INSERT OR REPLACE INTO players VALUES (?, ?, ?)',
+                                [(name, record["games_played"], record["games_won"]) for name, record in records])
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM players').fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
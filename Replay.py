@@ -0,0 +1,135 @@
+############################################## Imports ##############################################
+import argparse
+import time
+import EventLog
+import Server
+from EventLog import GAME_START, PLAYER_JOIN, QUESTION_SENT, ANSWER_RECEIVED, ROUND_RESOLVED, GAME_END
+
+
+############################################## Loading Functions ##############################################
+def load_games(path):
+    """
+    Rebuild the games recorded in an event log.
+    Every game is a dictionary with its players, its rounds (question, answers and logged resolution) and
+    its winner. Games that were still running when the log ends are skipped.
+    param path: the event log file written by the server
+    """
+    games = []
+    game = None
+    current_round = None
+    for event_type, timestamp, fields in EventLog.read_events(path):
+        if event_type == GAME_START:
+            game = {'game_id': fields[0], 'started_at': timestamp, 'ended_at': None, 'players': [],
+                    'rounds': [], 'winner': None}
+            current_round = None
+            games.append(game)
+        elif game is None:
+            continue
+        elif event_type == PLAYER_JOIN:
+            game['players'].append(fields[0])
+        elif event_type == QUESTION_SENT:
+            current_round = {'round': fields[0], 'question': fields[1], 'sent_at': timestamp, 'answers': [],
+                             'resolved': None}
+            game['rounds'].append(current_round)
+        elif event_type == ANSWER_RECEIVED and current_round is not None:
+            current_round['answers'].append((fields[0], fields[1], fields[2], timestamp))
+        elif event_type == ROUND_RESOLVED and current_round is not None:
+            current_round['resolved'] = (fields[1], fields[2])
+        elif event_type == GAME_END:
+            game['winner'] = fields[0]
+            game['ended_at'] = timestamp
+            game = None
+            current_round = None
+    return [game for game in games if game['ended_at'] is not None]
+
+
+############################################## Replay Functions ##############################################
+def wait_until(timestamp, log_start, replay_start, speed):
+    """
+    Sleep until the replay clock reaches a logged timestamp, scaled by speed (0 means don't wait at all).
+    """
+    if speed <= 0:
+        return
+    delay = replay_start + (timestamp - log_start) / 1e6 / speed - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def replay_game(game, speed):
+    """
+    Re-run one logged game through the server's game logic.
+    The answers are fed to Server.record_answer() and every round is resolved with Server.resolve_round(),
+    then the player statistics are updated like at the end of a real game.
+    param game: a game returned by load_games()
+    param speed: how many times faster than real time to replay, 0 replays as fast as possible
+    returns a list of differences between the log and the replay
+    """
+    Server.NAMES = [(name, counter) for counter, name in enumerate(game['players'], 1)]
+    replay_start = time.perf_counter()
+    mismatches = []
+    outcome, result = 'empty', None
+    for logged_round in game['rounds']:
+        question = logged_round['question']
+        Server.ANSWERS = {'True': [], 'False': []}
+        wait_until(logged_round['sent_at'], game['started_at'], replay_start, speed)
+        Server.q_data(question)
+        for name, answer, correct, timestamp in logged_round['answers']:
+            wait_until(timestamp, game['started_at'], replay_start, speed)
+            if question in Server.olympics_questions:
+                Server.record_answer(name, answer, question)
+            else:
+                # the question is no longer in the bank, trust the logged result
+                Server.update_question_data(question, correct)
+                Server.ANSWERS[str(correct)].append(name)
+        outcome, result = Server.resolve_round(Server.ANSWERS)
+        replayed = (len(Server.ANSWERS['True']), len(Server.ANSWERS['False']))
+        if logged_round['resolved'] is not None and logged_round['resolved'] != replayed:
+            mismatches.append(f'game {game["game_id"]} round {logged_round["round"]}: logged '
+                              f'{logged_round["resolved"]} correct/incorrect, replayed {replayed}')
+    wait_until(game['ended_at'], game['started_at'], replay_start, speed)
+    if outcome == 'winner':
+        Server.update_data(result)
+    elif outcome == 'no_winner':
+        Server.update_data_no_winner()
+    winner = result if outcome == 'winner' else ''
+    if winner != game['winner']:
+        mismatches.append(f'game {game["game_id"]}: logged winner {game["winner"]!r}, replayed {winner!r}')
+    Server.ANSWERS = {'True': [], 'False': []}
+    Server.NAMES = []
+    return mismatches
+
+
+############################################## Main Function ##############################################
+def main():
+    parser = argparse.ArgumentParser(description='Replay games recorded in the server event log.')
+    parser.add_argument('log', nargs='?', default=Server.EVENT_LOG_FILE, help='event log file written by the server')
+    parser.add_argument('--speed', type=float, default=0,
+                        help='times faster than real time, 0 (default) replays as fast as possible')
+    parser.add_argument('--stats', action='store_true', help='print the statistics rebuilt by the replay')
+    args = parser.parse_args()
+
+    games = load_games(args.log)
+    if not games:
+        Server.print_colors(f'No complete games found in {args.log}')
+        return
+    logged_seconds = sum(game['ended_at'] - game['started_at'] for game in games) / 1e6
+    rounds = sum(len(game['rounds']) for game in games)
+    answers = sum(len(logged_round['answers']) for game in games for logged_round in game['rounds'])
+
+    start = time.perf_counter()
+    mismatches = []
+    for game in games:
+        mismatches += replay_game(game, args.speed)
+    elapsed = time.perf_counter() - start
+
+    for mismatch in mismatches:
+        Server.print_colors(f'Mismatch: {mismatch}')
+    Server.print_colors(f'Replayed {len(games)} games, {rounds} rounds, {answers} answers in {elapsed:.3f}s '
+                        f'({logged_seconds:.1f}s in the log, {logged_seconds / max(elapsed, 1e-9):.0f}x real time, '
+                        f'{answers / max(elapsed, 1e-9):.0f} answers/s), {len(mismatches)} mismatches')
+    if args.stats:
+        Server.print_stats()
+
+
+if __name__ == '__main__':
+    main()
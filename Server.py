@@ -3,8 +3,30 @@ import socket
 import threading
 import time
 import random
+import math
+import bisect
+import functools
+import struct
+import heapq
+import selectors
+import statistics
 import pandas as pd
 import uuid
+import logging
+import Logger
+import json
+import re
+import os
+import signal
+import sys
+from types import MappingProxyType
+import EventLog
+import PlayerStats
+import Admin
+import Discovery
+import Transport
+from collections import OrderedDict, deque
+from EventLog import GAME_START, PLAYER_JOIN, QUESTION_SENT, ANSWER_RECEIVED, ROUND_RESOLVED, GAME_END
 
 pd.options.display.max_colwidth = 100
 
@@ -25,20 +47,20 @@ def dict_to_dataframe(dict_data):
     return df
 
 
-def print_colors_panda(message):
+def print_colors_panda(message, level=logging.INFO, **fields):
     """
-    Print a message with color formatting suitable for Pandas output.
+    Log a statistics block (e.g. Pandas output), shown in color and followed by a blank line on a terminal.
+    The record is queued for the background log writer, fields are added to structured (JSON/logfmt) output.
     """
-    colors = '\033[1;36m'
-    print(f'{colors}{message}\033[0m')
+    LOGGER.log(level, message, extra={'color': '\033[1;36m', 'block': True, 'fields': fields})
 
 
-def print_colors(message):
+def print_colors(message, level=logging.INFO, **fields):
     """
-    Print a message with color formatting.
+    Log a message, shown in color on a terminal.
+    The record is queued for the background log writer, fields are added to structured (JSON/logfmt) output.
     """
-    colors = '\033[1;35m'
-    print(f'{colors}{message}\033[0m')
+    LOGGER.log(level, message, extra={'color': '\033[1;35m', 'fields': fields})
 
 
 def get_local_ip():
@@ -69,48 +91,52 @@ def find_free_port(start_port, end_port):
                 return port
 
         except OSError as e:
-            print(f"Port {port} is already in use. Trying the next port...")
+            print_colors(f"Port {port} is already in use. Trying the next port...", logging.DEBUG)
             continue
 
 
+############################################## Logging ##############################################
+LOG_LEVEL = 'INFO'  # DEBUG, INFO, WARNING or ERROR
+LOG_FORMAT = 'json'  # 'json' or 'logfmt' when stdout isn't a terminal, a terminal gets colored text
+LOG_SAMPLE_RATE = 1.0  # share of DEBUG/INFO records written, warnings and errors are always written
+LOG_QUEUE_SIZE = 10000  # records waiting for the writer thread before new ones are dropped
+LOG_DROP_POLICY = 'newest'  # 'newest' drops the incoming record when the queue is full, 'oldest' the oldest queued one
+LOGGER = logging.getLogger('trivia.server')
+LOG_HANDLER = Logger.setup_logging(LOGGER, LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATE, LOG_QUEUE_SIZE, LOG_DROP_POLICY)
+
+
 ############################################## Game Quetions ##############################################
-olympics_questions = {
-    "The Olympic Games originated in ancient Greece.": True,
-    "The Olympic rings symbolize the five continents of the world.": True,
-    "The Summer and Winter Olympics are held every four years, alternating between each other.": True,
-    "The Olympic flame is lit in Olympia, Greece, during the opening ceremony of each Olympics.": True,
-    "The first modern Olympic Games were held in Athens, Greece, in 1896.": True,
-    "Athletes from all over the world compete in the Paralympic Games immediately after the Olympic Games.": True,
-    "The Olympic motto is 'Faster, Higher, Stronger.'": True,
-    "Golf is one of the sports included in the Summer Olympics.": True,
-    "The Olympic Games were canceled during both World War I and World War II.": True,
-    "Tokyo hosted the Olympic Games in 1964 and 2020 (postponed to 2021 due to the COVID-19 pandemic).": True,
-    "The Olympic Games include both individual and team sports.": True,
-    "The Olympic torch relay precedes the opening ceremony and travels through various cities and countries.": True,
-    "The Olympic Games have been held in Israel.": False,
-    "The Olympic flag features six colors: blue, yellow, black, green, red, and white.": True,
-    "The ancient Olympic Games included only athletic events, such as running and wrestling.": True,
-    "The Olympic Village provides accommodations for athletes during the Games.": True,
-    "An Israeli athlete has never won an Olympic medal": False,
-    "Gymnastics is one of the oldest sports included in the modern Olympic Games.": True,
-    "The Olympic Games have been held in Asia more times than in any other continent.": True,
-    "The Olympic Games have always included a closing ceremony since their inception.": False,
-    "The Olympic Games have never been held in Africa.": False,
-    "The Olympic Creed states, 'The most important thing in the Olympic Games is to win.'": False,
-    "It is impossible for two athletes to win a gold medal together in the same competition at the Olympics": False,
-    "The Olympic Games were first televised in color during the 1972 Munich Olympics.": False,
-    "The Olympic Games have never been affected by weather conditions causing any delays.": False,
-    "Baseball has been a part of the Summer Olympics since the inception of the modern Games.": False,
-    "The Olympic Games have been hosted by fewer than 20 different countries.": False,
-    "The Olympic Games were first broadcast on television in the 1950s.": False,
-    "The Olympic torch has never been extinguished during the relay.": False,
-    "The Olympic Games have never been postponed due to non-political reasons.": False,
-    "The Olympic Games have always been held in the month of August.": False,
-    "The Olympic Games have never faced controversies over doping scandals.": False,
-    "Chess has been an official Olympic sport since the first modern Games.": False,
-    "The upcoming Summer Olympics will be held in Paris": True,
-    "Israel has never hosted an Olympic Games": True
-}
+QUESTIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'questions.json')
+
+
+def load_question_bank(path):
+    """
+    Load and validate the question bank.
+    The file is a JSON object mapping every question to its answer (true/false).
+    returns a read-only snapshot of the bank, raises ValueError if the file is not a valid bank.
+    """
+    with open(path, encoding='utf-8') as f:
+        bank = json.load(f)
+    if not isinstance(bank, dict) or not bank:
+        raise ValueError(f'{path} must hold a non-empty JSON object of question: true/false')
+    for question, answer in bank.items():
+        if not question.strip():
+            raise ValueError(f'{path} has an empty question')
+        if not isinstance(answer, bool):
+            raise ValueError(f'the answer to "{question}" must be true or false')
+    return MappingProxyType(dict(bank))
+
+
+def encode_questions(bank):
+    """
+    Encode every question of a bank once, so rounds send the cached bytes instead of encoding the question again.
+    """
+    return MappingProxyType({question: question.encode('utf-8') for question in bank})
+
+
+# the current snapshot of the question bank, replaced as a whole by reload_questions() and never changed in place
+olympics_questions = load_question_bank(QUESTIONS_FILE)
+QUESTION_BYTES = encode_questions(olympics_questions)  # question -> encoded question, replaced with the bank
 
 ############################################## Global Variables ##############################################
 
@@ -119,8 +145,6 @@ IP_ADDRESS = None
 UDP_PORT = 13117
 TCP_PORT = 0
 SERVER_NAME = 'TriviaMaster'
-MAGIC_COOKIE = b'\xab\xcd\xdc\xba'
-OFFER_MESSAGE_TYPE = b'\x02'
 
 # Game data
 NAMES = []
@@ -128,20 +152,117 @@ CONNECTIONS = []
 COUNTER = 0
 CON_NAME = {}
 ANSWERS = {'True': [], 'False': []}
+TRUE_ANSWERS = ('T', 'Y', '1', 't', 'y')
+FALSE_ANSWERS = ('F', 'N', '0', 'n', 'f')
 TCP_SOCKET = None
 ROUND = 1
 UDP_SOCKET = None
 GAME_READY_EVENT = threading.Event()
 LOCK = threading.Lock()
+# Transport
+TRANSPORT_PROFILE = 'lan'  # socket options of the player connections, a profile name in Transport.PROFILES
+# Admission control
+TCP_BACKLOG = 128  # connections the kernel queues before accept(), a burst after an offer lands here
+MAX_PLAYERS_PER_SERVER = 1000  # players in the lobby plus handshakes in flight
+MAX_PLAYERS_PER_ROOM = 200  # players admitted to a single game
+HANDSHAKE_QUEUE_SIZE = 64  # handshakes (waiting for the player's name) allowed in flight at once
+HANDSHAKE_DEADLINE = 10  # seconds a new connection has to send its name
+RETRY_AFTER = 5  # seconds a rejected client is told to wait before trying again
+SERVER_FULL_MESSAGE = 'Server Full! Try again in {} seconds'
+HANDSHAKE_TIMEOUT_MESSAGE = 'Too Slow! Send your name within {} seconds of connecting'
+HANDSHAKE_SLOTS = threading.BoundedSemaphore(HANDSHAKE_QUEUE_SIZE)
+PENDING_HANDSHAKES = 0
+ADMISSION_STATS = {'accepted': 0, 'rejected_server_full': 0, 'rejected_room_full': 0,
+                   'rejected_handshake_queue_full': 0, 'rejected_handshake_deadline': 0,
+                   'rejected_game_started': 0, 'rejected_bad_name': 0}
+# Event log
+EVENT_LOG_FILE = 'events.log'  # None disables the event log
+EVENT_LOG_MAX_BYTES = 16 * 1024 * 1024  # rotate the log when it grows past this size
+EVENT_LOG_BACKUPS = 5  # rotated log files to keep
+EVENT_LOG = None
+GAME_ID = 0
+# Question scheduling
+QUESTION_SCHEDULING = 'random'  # 'random', or 'difficulty' to pick harder questions as fewer rounds are left
+TARGET_ROUNDS = 5  # rounds a 'difficulty' game should take to find a winner
+DIFFICULTY_PRIOR = (1, 1)  # pseudo counts (correct, incorrect) so rarely answered questions start near 50%
+SCHEDULING_CANDIDATES = 3  # questions closest to the target difficulty to choose from at random
+DIFFICULTY = {}  # question -> smoothed share of incorrect answers
+DIFFICULTY_INDEX = []  # (difficulty, question) sorted by difficulty, kept up to date on every answer
+ASKED_QUESTIONS = set()  # questions already asked in the current game
+# Player statistics memory budget
+WIN_DATA_CAPACITY = 10000  # exact player records kept in memory
+TOP_PLAYERS_PINNED = 100  # players with the most wins, and as many by percentage of wins, never evicted from WIN_DATA
+WINS_SKETCH_CAPACITY = 1000  # counters of the heavy-hitters sketch behind the wins leaderboard
+PLAYER_STORE_FILE = 'players.db'  # SQLite file cold player records are spilled to, None just evicts them
+PLAYER_STORE = None
+WINS_SKETCH = PlayerStats.SpaceSaving(WINS_SKETCH_CAPACITY)
+# Game turnover
+GAME_PAUSE = 0  # seconds to wait after a game before sending out offers again
+LOBBY_WAIT = 10  # seconds without a new player after which the game starts
+LOBBY_POLL_INTERVAL = 0.1  # seconds between lobby checks while players are waiting or handshakes are in flight
+LAST_ADMITTED_AT = None  # time.monotonic() when the last player was admitted to the lobby
+STATS_REPORT_INTERVAL = 30  # seconds between statistics reports, printed in the background when a game has ended
+STATS_SNAPSHOT = None  # copy of the statistics published at the end of every game
+GAMES_PLAYED = 0
+SERVER_STARTED_AT = time.monotonic()
+GAME_ENDED_AT = None
+LAST_TURNOVER = None  # seconds from the end of the last game to the next lobby opening
+# Message payloads, encoded once
+WELCOME_BANNER = b'Welcome to the Mystic server, where we are answering trivia questions about countries\n'
+TOURNAMENT_BANNER = b'Welcome to the Mystic server tournament!\n'
+PLAYER_LINE = b'Player %d : %s\n'
+WELCOME_PROMPT = b'==\n Question: '
+ROUND_HEADER = b'Round %d, played by '
+HEAT_ROUND_HEADER = b'Round %d of heat %d (stage %d), played by '
+ROUND_PROMPT = b':\nTrue or false: '
+CORRECT_LINE = b'%s Is Correct!\n'
+WINNER_LINE = b'%s Is Correct! %s Wins!\n'
+INCORRECT_LINE = b'%s Is InCorrect!\n'
+WINNER_MESSAGE = b'Game Over!\n Congratulations to the winner: %s'
+TOURNAMENT_WINNER_MESSAGE = b'Game Over!\n Congratulations to the tournament winner: %s'
+NO_WINNER_MESSAGE = b'Game Over!\nNo Winners!'
+INVALID_ANSWER_MESSAGE = b'Invalid Answer!'
+# Latency measurement
+ROUND_TIME = 10  # seconds players have to answer a question
+PING_TIMEOUT = 0.5  # seconds to wait for pongs between rounds
+LOBBY_PINGS = 3  # pings sent to every new player during the handshake
+MAX_LATENCY_COMPENSATION = 1  # most extra seconds to answer given to a slow connection
+LATENCY_SAMPLES = 32  # (rtt, clock offset) samples kept per player
+LATENCY = {}  # player name -> deque of (rtt, clock offset) samples in seconds, for the players of the current game
+# Input flood protection
+INPUT_MESSAGE_RATE = 2  # messages per second a player may send, on average
+INPUT_MESSAGE_BURST = 10  # messages a player may send at once
+INPUT_BYTE_RATE = 256  # bytes per second a player may send, on average
+INPUT_BYTE_BURST = 4096  # bytes a player may send at once
+MAX_INVALID_ANSWERS = 3  # 'Invalid Answer!' replies per round, further invalid input is dropped without a reply
+MAX_NAME_LENGTH = 32  # characters in a player name
+NAME_PATTERN = re.compile(r"[\w :.'-]+")  # letters, digits and the punctuation of the bot names
+INPUT_BUDGETS = {}  # connection -> [messages left, bytes left, time.monotonic() of the last refill]
+FLOOD_STATS = {'disconnected_rate_limited': 0, 'invalid_answers_dropped': 0}
+# Tournament
+TOURNAMENT_MODE = False  # split big lobbies into parallel heats whose winners advance to the next stage
+HEAT_SIZE = 16  # most players per heat, lobbies of at most HEAT_SIZE players play a normal game
+HEATS = {}  # (stage, heat) -> live state of the heats running now
+# Virtual bots
+VIRTUAL_BOTS = 0  # in-process bot players added to every game (not to tournaments), without a socket or thread each
+VIRTUAL_BOT_ACCURACY = (0.5, 0.9)  # range each virtual bot's chance of answering correctly is drawn from
+VIRTUAL_BOT_DELAY = (3, 0.5)  # median seconds and log-normal spread of a virtual bot's answer time
+VIRTUAL_BOT_MODELS = {}  # name -> chance of answering correctly, for the virtual bots of the current game
+# Admin API
+ADMIN_HOST = '127.0.0.1'  # the admin API is only reachable from this machine
+ADMIN_PORT = 8117  # None disables the admin API
+ADMIN_TOP_N = 100  # rows of each ranking kept in the statistics snapshot
+LIVE_STATE = {'lobby': {'open': False, 'players': 0, 'pending_handshakes': 0}, 'games': []}
+ADMIN_SNAPSHOTS = (LIVE_STATE, None)  # (live state, statistics), replaced together, never changed in place
 # Data to store the statistics
-WIN_DATA = {}
+WIN_DATA = OrderedDict()  # least recently played first
 QUESTIONS_ANSWERS_DATA = {}
 QUESTIONS_DATA = {}
 
 
 ############################################## Statistics Functions ##############################################
 
-def update_question_data(question, answer):
+def update_question_data(question, answer, count=1):
     """
     Update question-answer data with the result of a question.
     statistic about the distribution of answers for a question.
@@ -152,20 +273,22 @@ def update_question_data(question, answer):
 
     :param question:the selected question
     :param answer: client/bot answer
+    :param count: number of players who gave this answer (virtual bots are counted at once)
     """
     global QUESTIONS_ANSWERS_DATA
 
     if question in QUESTIONS_ANSWERS_DATA:
         if answer:
-            QUESTIONS_ANSWERS_DATA[question]["correct"] += 1
+            QUESTIONS_ANSWERS_DATA[question]["correct"] += count
         else:
-            QUESTIONS_ANSWERS_DATA[question]["incorrect"] += 1
-        QUESTIONS_ANSWERS_DATA[question]["total"] += 1
+            QUESTIONS_ANSWERS_DATA[question]["incorrect"] += count
+        QUESTIONS_ANSWERS_DATA[question]["total"] += count
     else:
         if answer:
-            QUESTIONS_ANSWERS_DATA[question] = {"correct": 1, "incorrect": 0, "total": 1}
+            QUESTIONS_ANSWERS_DATA[question] = {"correct": count, "incorrect": 0, "total": count}
         else:
-            QUESTIONS_ANSWERS_DATA[question] = {"correct": 0, "incorrect": 1, "total": 1}
+            QUESTIONS_ANSWERS_DATA[question] = {"correct": 0, "incorrect": count, "total": count}
+    update_difficulty_index(question)
 
 
 def update_data_no_winner():
@@ -175,23 +298,9 @@ def update_data_no_winner():
     increments the 'games_played' counter for each player and calculates the percentage of wins
     based on the total number of games played and games won.
     """
-    global WIN_DATA
     global NAMES
 
-    for name, _ in NAMES:
-        if name.startswith('BOT:'):
-            continue
-        if name in WIN_DATA:
-            WIN_DATA[name]["games_played"] += 1
-        else:
-            WIN_DATA[name] = {"games_played": 1, "games_won": 0,
-                              "percentage_of_wins": 0, }
-
-    # Calculate the percentage of wins for each player
-    for name in WIN_DATA:
-        games_played = WIN_DATA[name]["games_played"]
-        games_won = WIN_DATA[name]["games_won"]
-        WIN_DATA[name]["percentage_of_wins"] = (games_won / games_played) * 100
+    record_game([name for name, _ in NAMES], None)
 
 
 def update_data(winner):
@@ -203,24 +312,71 @@ def update_data(winner):
     based on the total number of games played and games won.
     param winner: the winner of the game
     """
-    global WIN_DATA
     global NAMES
 
-    for name, _ in NAMES:
+    record_game([name for name, _ in NAMES], winner)
+
+
+def record_game(names, winner):
+    """
+    Record a finished game in the player statistics.
+    Only the records of the players of this game are touched: they are loaded back from PLAYER_STORE if
+    they were spilled, updated, and moved to the most recently played end of WIN_DATA. Bots are not recorded.
+    param names: the names of the players of the game
+    param winner: the winner of the game, or None
+    """
+    global WIN_DATA
+    global WINS_SKETCH
+
+    for name in names:
         if name.startswith('BOT:'):
             continue
-        if name in WIN_DATA:
-            WIN_DATA[name]["games_played"] += 1
-        else:
-            WIN_DATA[name] = {"games_played": 1, "games_won": 0,
-                              "percentage_of_wins": 0, }
-    if not winner.startswith('BOT:'):
-        WIN_DATA[winner]["games_won"] += 1
-    # Calculate the percentage of wins for each player
-    for name in WIN_DATA:
-        games_played = WIN_DATA[name]["games_played"]
-        games_won = WIN_DATA[name]["games_won"]
-        WIN_DATA[name]["percentage_of_wins"] = (games_won / games_played) * 100
+        record = WIN_DATA.pop(name, None)
+        if record is None and PLAYER_STORE is not None:
+            record = PLAYER_STORE.load(name)
+        if record is None:
+            record = {"games_played": 0, "games_won": 0, "percentage_of_wins": 0, }
+        record["games_played"] += 1
+        if name == winner:
+            record["games_won"] += 1
+            WINS_SKETCH.add(name)
+        record["percentage_of_wins"] = (record["games_won"] / record["games_played"]) * 100
+        WIN_DATA[name] = record
+    evict_players()
+
+
+def leaderboard_key(item):
+    """
+    The order of the percentage of wins leaderboard, for (name, record) pairs of WIN_DATA.
+    """
+    return item[1]["percentage_of_wins"], item[1]["games_played"]
+
+
+def evict_players():
+    """
+    Keep WIN_DATA within WIN_DATA_CAPACITY.
+    When WIN_DATA is over capacity, the least recently played players are spilled to PLAYER_STORE (or dropped when there is no store),
+    except the TOP_PLAYERS_PINNED players with the most wins and the players of the percentage of wins leaderboard
+    (at least ADMIN_TOP_N), which always stay in memory.
+    """
+    global WIN_DATA
+
+    if len(WIN_DATA) <= WIN_DATA_CAPACITY:
+        return
+    # evict down to 90% of the capacity, so the store is written in batches and not after every game
+    target = WIN_DATA_CAPACITY * 9 // 10
+    pinned = {name for name, _, _ in WINS_SKETCH.top(TOP_PLAYERS_PINNED)}
+    pinned.update(name for name, _ in heapq.nlargest(max(TOP_PLAYERS_PINNED, ADMIN_TOP_N), WIN_DATA.items(),
+                                                     key=leaderboard_key))
+    evicted = []
+    for name in list(WIN_DATA):
+        if len(WIN_DATA) <= target:
+            break
+        if name in pinned:
+            continue
+        evicted.append((name, WIN_DATA.pop(name)))
+    if PLAYER_STORE is not None and evicted:
+        PLAYER_STORE.save(evicted)
 
 
 def q_data(question):
@@ -237,36 +393,489 @@ def q_data(question):
         QUESTIONS_DATA[question] = {'total': 1}
 
 
-def print_stats():
+def log_event(event_type, *fields):
+    """
+    Append an event to the game event log, if the event log is enabled.
+    param event_type: one of the event types in EventLog.py
+    """
+    if EVENT_LOG is not None:
+        EVENT_LOG.write(event_type, *fields)
+
+
+def snapshot_stats():
+    """
+    Copy the statistics, so they can be reported from other threads while the next game goes on.
+    Every dictionary is copied in a single C-level call, so answer threads still updating the question
+    statistics can't break the copy. Only the ADMIN_TOP_N best players are copied, not all of WIN_DATA.
+    The percentage of wins leaderboard ranks the players held in WIN_DATA: its leaders are pinned there, but a
+    spilled player only comes back to it after playing again.
+    """
+    questions_data = {question: dict(data) for question, data in QUESTIONS_DATA.copy().items()}
+    questions_answers_data = {question: dict(data) for question, data in QUESTIONS_ANSWERS_DATA.copy().items()}
+    difficulty = DIFFICULTY.copy()
+    top_players = heapq.nlargest(ADMIN_TOP_N, WIN_DATA.copy().items(), key=leaderboard_key)
+    most_viewed = heapq.nlargest(ADMIN_TOP_N, questions_data.items(), key=lambda item: item[1]['total'])
+    hardest = heapq.nlargest(ADMIN_TOP_N, questions_answers_data.items(),
+                             key=lambda item: difficulty.get(item[0], 0))
+    games_per_hour = GAMES_PLAYED / max(time.monotonic() - SERVER_STARTED_AT, 1) * 3600
+    return {'top_players': [{'name': name, **record} for name, record in top_players],
+            'wins_top': WINS_SKETCH.top(3),
+            'most_viewed': [{'question': question, **data} for question, data in most_viewed],
+            'hardest': [{'question': question, 'difficulty': round(difficulty.get(question, 0), 4), **data}
+                        for question, data in hardest],
+            'questions_answers_data': questions_answers_data,
+            'latency': latency_percentiles(),
+            'counters': {'games_played': GAMES_PLAYED, 'games_per_hour': round(games_per_hour, 1),
+                         'last_turnover_ms': None if LAST_TURNOVER is None else round(LAST_TURNOVER * 1000, 3),
+                         'admission': ADMISSION_STATS.copy(), 'flood': FLOOD_STATS.copy(),
+                         'log_dropped': LOG_HANDLER.dropped}}
+
+
+def publish_stats():
+    """
+    Publish a new statistics snapshot for the background reporter and the admin API.
+    """
+    global STATS_SNAPSHOT
+    global ADMIN_SNAPSHOTS
+
+    STATS_SNAPSHOT = snapshot_stats()
+    ADMIN_SNAPSHOTS = (LIVE_STATE, STATS_SNAPSHOT)
+
+
+def publish_live_state(players_alive=None):
+    """
+    Publish the state of the lobby and the running game for the admin API.
+    param players_alive: players still in the game this round, None while there's no game running
+    """
+    global LIVE_STATE
+    global ADMIN_SNAPSHOTS
+
+    if GAME_READY_EVENT.is_set():
+        lobby = {'open': False, 'players': 0, 'pending_handshakes': PENDING_HANDSHAKES}
+        games = list(HEATS.copy().values()) or [{'game_id': GAME_ID, 'round': ROUND, 'players': len(NAMES),
+                                                 'alive': players_alive}]
+    else:
+        lobby = {'open': True, 'players': len(NAMES), 'pending_handshakes': PENDING_HANDSHAKES}
+        games = []
+    LIVE_STATE = {'lobby': lobby, 'games': games}
+    ADMIN_SNAPSHOTS = (LIVE_STATE, STATS_SNAPSHOT)
+
+
+def stats_reporter():
+    """
+    Print the latest statistics snapshot every STATS_REPORT_INTERVAL seconds, if a game ended since the last report.
+    """
+    reported = None
+    while True:
+        time.sleep(STATS_REPORT_INTERVAL)
+        snapshot = STATS_SNAPSHOT
+        if snapshot is not None and snapshot is not reported:
+            print_stats(snapshot)
+            reported = snapshot
+
+
+def print_stats(snapshot=None):
     """
     Print statistics related to game data.
     This function prints various statistics related to game data, including the top 3 players
     with the highest percentage of wins, the top 3 most viewed questions, and the top 3 most
     answered correctly questions.
+    param snapshot: statistics copied by snapshot_stats(), by default a copy is taken now
     """
-    # print the top 3 players in percentage of wins
-    global WIN_DATA
-    global QUESTIONS_DATA
-    global QUESTIONS_ANSWERS_DATA
+    if snapshot is None:
+        snapshot = snapshot_stats()
 
+    # print the top 3 players in percentage of wins
     # if the dictionary is not empty 
-    if WIN_DATA:
-        df = dict_to_dataframe(WIN_DATA)
-        df = df.sort_values(by=['percentage_of_wins', 'games_played'], ascending=[False, False])
-        print_colors_panda(f'Top 3 players in percentage of wins:\n{df.head(3)}')
-        print("\n")
+    if snapshot['top_players']:
+        df = pd.DataFrame(snapshot['top_players'][:3]).set_index('name')
+        print_colors_panda(f'Top 3 players in percentage of wins:\n{df}')
+
+    # print the top 3 players in number of wins, from the heavy-hitters sketch
+    if snapshot['wins_top']:
+        leaders = '\n'.join(f'{name}: {wins} wins' + (f' (at most {error} overcounted)' if error else '')
+                             for name, wins, error in snapshot['wins_top'])
+        print_colors_panda(f'Top 3 players in number of wins:\n{leaders}')
 
     # print the top 3 viewed question
-    df = dict_to_dataframe(QUESTIONS_DATA)
-    df = df.sort_values(by='total', ascending=False)
-    print_colors_panda(f'Top 3 viewed question:\n{df.head(3)}')
-    print("\n")
+    if snapshot['most_viewed']:
+        df = pd.DataFrame(snapshot['most_viewed'][:3]).set_index('question')
+        print_colors_panda(f'Top 3 viewed question:\n{df}')
 
     # print the top 3 answered question
-    df = dict_to_dataframe(QUESTIONS_ANSWERS_DATA)
-    df = df.sort_values(by='correct', ascending=False)
-    print_colors_panda(f'Top 3 answered question:\n{df.head(3)}')
-    print("\n")
+    if snapshot['questions_answers_data']:
+        df = dict_to_dataframe(snapshot['questions_answers_data'])
+        df = df.sort_values(by='correct', ascending=False)
+        print_colors_panda(f'Top 3 answered question:\n{df.head(3)}')
+
+    # print the admission counters
+    counters = snapshot['counters']
+    admission_stats = counters['admission']
+    rejected = {reason: count for reason, count in admission_stats.items() if reason.startswith('rejected_')}
+    print_colors_panda(f'Accepted clients: {admission_stats["accepted"]}, rejected clients: {rejected}',
+                       **admission_stats)
+
+    # print the game turnover
+    turnover = counters['last_turnover_ms']
+    turnover = f', last turnover {turnover:.1f} ms' if turnover is not None else ''
+    print_colors_panda(f'Games played: {counters["games_played"]}, {counters["games_per_hour"]} games per hour{turnover}',
+                       games_played=counters['games_played'], games_per_hour=counters['games_per_hour'])
+    if counters['log_dropped']:
+        print_colors(f'Log records dropped: {counters["log_dropped"]}', logging.WARNING,
+                     log_dropped=counters['log_dropped'])
+
+
+############################################## Question Scheduling Functions ##############################################
+
+def question_difficulty(question):
+    """
+    Estimate how hard a question is from QUESTIONS_ANSWERS_DATA.
+    returns the share of incorrect answers, smoothed with DIFFICULTY_PRIOR so a question answered a handful of
+    times doesn't jump straight to 0% or 100%.
+    """
+    prior_correct, prior_incorrect = DIFFICULTY_PRIOR
+    data = QUESTIONS_ANSWERS_DATA.get(question, {"correct": 0, "incorrect": 0, "total": 0})
+    return (data["incorrect"] + prior_incorrect) / (data["total"] + prior_correct + prior_incorrect)
+
+
+def update_difficulty_index(question):
+    """
+    Move a question to its new place in DIFFICULTY_INDEX after its statistics changed.
+    """
+    global DIFFICULTY
+    global DIFFICULTY_INDEX
+
+    with LOCK:
+        if question in DIFFICULTY:
+            old = (DIFFICULTY[question], question)
+            position = bisect.bisect_left(DIFFICULTY_INDEX, old)
+            if position < len(DIFFICULTY_INDEX) and DIFFICULTY_INDEX[position] == old:
+                del DIFFICULTY_INDEX[position]
+        DIFFICULTY[question] = question_difficulty(question)
+        bisect.insort(DIFFICULTY_INDEX, (DIFFICULTY[question], question))
+
+
+def build_difficulty_index(bank):
+    """
+    Add every question of a question bank snapshot to DIFFICULTY_INDEX.
+    """
+    for question in bank:
+        update_difficulty_index(question)
+
+
+def reload_questions():
+    """
+    Reload the question bank from QUESTIONS_FILE.
+    The new bank is validated and indexed before it replaces the current snapshot in a single assignment, so
+    the game never waits for the reload. Rounds already running keep the snapshot they started with.
+    An invalid file leaves the current bank in place.
+    """
+    global olympics_questions
+    global QUESTION_BYTES
+
+    try:
+        bank = load_question_bank(QUESTIONS_FILE)
+    except (OSError, ValueError) as e:
+        print_colors(f'Question bank not reloaded: {e}', logging.ERROR)
+        return
+    build_difficulty_index(bank)
+    QUESTION_BYTES = encode_questions(bank)
+    olympics_questions = bank
+    print_colors(f'Question bank reloaded, {len(bank)} questions')
+
+
+def request_reload(*_):
+    """
+    Reload the question bank in the background (signal handler and admin command).
+    """
+    threading.Thread(target=reload_questions, daemon=True).start()
+
+
+def select_question(players_alive, bank, round_number=None, asked=None):
+    """
+    Select the question for the next round.
+    In 'random' scheduling every question is equally likely. In 'difficulty' scheduling the question is
+    chosen so that the players still alive are expected to narrow down to one winner by TARGET_ROUNDS:
+    with n players and r rounds left, a question answered wrong by 1 - n^(-1/r) of the players leaves
+    n * (1 - p)^r = 1 expected survivors. One of the SCHEDULING_CANDIDATES questions closest to that
+    difficulty, not yet asked in this game, is picked at random.
+    param players_alive: number of players who will get the question
+    param bank: the question bank snapshot of the current round
+    param round_number: the round the question is for, ROUND by default (heats count their own rounds)
+    param asked: the questions already asked in this game, ASKED_QUESTIONS by default (heats keep their own)
+    """
+    global ASKED_QUESTIONS
+
+    if round_number is None:
+        round_number = ROUND
+    if asked is None:
+        asked = ASKED_QUESTIONS
+    if QUESTION_SCHEDULING != 'difficulty':
+        question = random.choice(list(bank.keys()))
+        asked.add(question)
+        return question
+
+    rounds_left = max(TARGET_ROUNDS - round_number + 1, 1)
+    target = 1 - players_alive ** (-1 / rounds_left) if players_alive > 1 else 0.5
+    with LOCK:
+        index = [entry for entry in DIFFICULTY_INDEX if entry[1] in bank]
+    fresh = [entry for entry in index if entry[1] not in asked] or index
+    position = bisect.bisect_left(fresh, (target, ''))
+    low, high = position - 1, position
+    candidates = []
+    # walk outwards from the target, always taking the closer neighbour
+    while len(candidates) < SCHEDULING_CANDIDATES and (low >= 0 or high < len(fresh)):
+        if high >= len(fresh) or (low >= 0 and target - fresh[low][0] <= fresh[high][0] - target):
+            candidates.append(fresh[low][1])
+            low -= 1
+        else:
+            candidates.append(fresh[high][1])
+            high += 1
+    question = random.choice(candidates)
+    asked.add(question)
+    return question
+
+
+############################################## Latency Functions ##############################################
+
+def split_control_lines(data):
+    """
+    Separate the control lines ('#PONG ...') from the rest of the data received from a client.
+    returns the list of control lines and the remaining text
+    """
+    if '#' not in data:
+        return [], data
+    control, text = [], []
+    for line in data.split('\n'):
+        (control if line.startswith('#') else text).append(line)
+    return control, '\n'.join(text)
+
+
+def record_pong(name, line, received_at):
+    """
+    Store the round-trip time and clock offset of a '#PONG <server sent> <client received> <client sent>' line.
+    Like NTP: rtt = (t3 - t0) - (t2 - t1) and offset = ((t1 - t0) + (t2 - t3)) / 2, where t0 and t3 are the
+    server's send and receive times and t1 and t2 the client's.
+    """
+    global LATENCY
+
+    try:
+        sent_at, client_received_at, client_sent_at = (float(value) for value in line.split()[1:4])
+    except ValueError:
+        return
+    rtt = (received_at - sent_at) - (client_sent_at - client_received_at)
+    offset = ((client_received_at - sent_at) + (client_sent_at - received_at)) / 2
+    LATENCY.setdefault(name, deque(maxlen=LATENCY_SAMPLES)).append((max(rtt, 0), offset))
+
+
+def ping_players(players):
+    """
+    Measure the latency of several connections at once.
+    This function sends every connection a '#PING <server time>' line and collects the pongs until all of
+    them answered or PING_TIMEOUT seconds passed.
+    param players: dictionary of connection to player name
+    """
+    pending = {}
+    for conn in players:
+        try:
+            conn.send(f'#PING {time.time():.6f}\n'.encode('utf-8'))
+            pending[conn] = b''
+        except OSError:
+            continue
+    deadline = time.monotonic() + PING_TIMEOUT
+    with selectors.DefaultSelector() as selector:
+        for conn in pending:
+            selector.register(conn, selectors.EVENT_READ)
+        while pending and deadline > time.monotonic():
+            for key, _ in selector.select(deadline - time.monotonic()):
+                conn = key.fileobj
+                try:
+                    data = conn.recv(1024)
+                except OSError:
+                    data = b''
+                received_at = time.time()
+                if not data or not spend_input(conn, len(data)):
+                    selector.unregister(conn)
+                    pending.pop(conn)
+                    if data:
+                        drop_flooder(conn, players[conn])
+                    continue
+                *lines, pending[conn] = (pending[conn] + data).split(b'\n')
+                for line in lines:
+                    if line.startswith(b'#PONG'):
+                        record_pong(players[conn], line.decode('utf-8', 'replace'), received_at)
+                        selector.unregister(conn)
+                        pending.pop(conn)
+                        break
+
+
+def player_rtt(name):
+    """
+    The median round-trip time of a player in seconds, 0 if it was never measured.
+    """
+    samples = LATENCY.get(name)
+    if not samples:
+        return 0
+    return statistics.median(rtt for rtt, _ in samples)
+
+
+def latency_compensation(name):
+    """
+    Extra seconds a player gets to answer: the time the question spends on its way to the player
+    (half the round trip), at most MAX_LATENCY_COMPENSATION.
+    """
+    return min(player_rtt(name) / 2, MAX_LATENCY_COMPENSATION)
+
+
+def timer_line(name):
+    """
+    The '#TIMER <seconds>' line sent ahead of a question: the time the player has left to answer when the
+    question reaches them.
+    """
+    one_way = player_rtt(name) / 2
+    return encode_timer(round(ROUND_TIME + min(one_way, MAX_LATENCY_COMPENSATION) - one_way, 2))
+
+
+@functools.lru_cache(maxsize=1024)
+def encode_timer(remaining):
+    """
+    The encoded '#TIMER' line, cached: most players get the full ROUND_TIME, so they share one line.
+    """
+    return f'#TIMER {remaining:.2f}\n'.encode('utf-8')
+
+
+def latency_percentiles():
+    """
+    Round-trip time percentiles and clock offset of every player with latency samples, in milliseconds.
+    """
+    report = []
+    for name, samples in LATENCY.copy().items():
+        samples = list(samples)
+        rtts = sorted(rtt for rtt, _ in samples)
+        if not rtts:
+            continue
+        best_offset = min(samples)[1]  # the sample with the shortest round trip has the most accurate offset
+        report.append({'name': name, 'samples': len(rtts),
+                       'rtt_p50_ms': round(rtts[int(0.5 * (len(rtts) - 1))] * 1000, 3),
+                       'rtt_p90_ms': round(rtts[int(0.9 * (len(rtts) - 1))] * 1000, 3),
+                       'rtt_p99_ms': round(rtts[int(0.99 * (len(rtts) - 1))] * 1000, 3),
+                       'clock_offset_ms': round(best_offset * 1000, 3)})
+    return report
+
+
+############################################## Flood Protection Functions ##############################################
+
+def spend_input(conn, size):
+    """
+    Charge one message of `size` bytes to a connection's input budget.
+    Every connection has two token buckets, one for messages and one for bytes, refilled at INPUT_MESSAGE_RATE
+    and INPUT_BYTE_RATE up to their burst sizes.
+    returns False if the connection sent more than its budget allows
+    """
+    now = time.monotonic()
+    budget = INPUT_BUDGETS.setdefault(conn, [INPUT_MESSAGE_BURST, INPUT_BYTE_BURST, now])
+    elapsed = now - budget[2]
+    budget[0] = min(budget[0] + elapsed * INPUT_MESSAGE_RATE, INPUT_MESSAGE_BURST) - 1
+    budget[1] = min(budget[1] + elapsed * INPUT_BYTE_RATE, INPUT_BYTE_BURST) - size
+    budget[2] = now
+    return budget[0] >= 0 and budget[1] >= 0
+
+
+def valid_name(name):
+    """
+    Check a player name: 1 to MAX_NAME_LENGTH letters, digits, spaces or the punctuation in NAME_PATTERN.
+    """
+    return 0 < len(name) <= MAX_NAME_LENGTH and NAME_PATTERN.fullmatch(name) is not None
+
+
+def drop_connection(conn):
+    """
+    Close a connection right away, without reading what it still sends or waiting for the close handshake:
+    SO_LINGER 0 makes close() reset the connection, so it leaves nothing in TIME_WAIT.
+    The player is removed from the game.
+    """
+    global CONNECTIONS
+    global CON_NAME
+
+    try:
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+    except OSError:
+        pass
+    with LOCK:
+        if conn in CONNECTIONS:
+            CONNECTIONS.remove(conn)
+        CON_NAME.pop(conn, None)
+        INPUT_BUDGETS.pop(conn, None)
+    conn.close()
+
+
+def drop_flooder(conn, name):
+    """
+    Disconnect a player who sent more than their input budget allows.
+    """
+    global FLOOD_STATS
+
+    with LOCK:
+        FLOOD_STATS['disconnected_rate_limited'] += 1
+    print_colors(f'Disconnecting {name}: input rate limit exceeded', logging.WARNING, player=name)
+    drop_connection(conn)
+
+
+############################################## Virtual Bot Functions ##############################################
+
+def add_virtual_bots():
+    """
+    Seat VIRTUAL_BOTS virtual bots in the game that is starting.
+    Virtual bots are only names in NAMES with an answer model: they have no connection, receive no messages and
+    answer when the round ends. They are named like the bots of Bot.py, so they're left out of WIN_DATA.
+    """
+    global NAMES
+    global COUNTER
+    global VIRTUAL_BOT_MODELS
+
+    VIRTUAL_BOT_MODELS = {}
+    for _ in range(VIRTUAL_BOTS):
+        name = f'BOT: Virtual_{generate_bot_name()}'
+        COUNTER += 1
+        NAMES.append((name, COUNTER))
+        VIRTUAL_BOT_MODELS[name] = random.uniform(*VIRTUAL_BOT_ACCURACY)
+
+
+def answer_virtual_bots(names, question, bank, question_sent_at):
+    """
+    Add the answers of the virtual bots playing this round to ANSWERS.
+    Each bot draws its answer time from the log-normal delay model and answers correctly with its own chance;
+    a bot whose answer time is past ROUND_TIME doesn't answer. The question statistics are updated once for all
+    the bots, and the answers are logged in the order and at the time they would have arrived.
+    param names: the names of the players of the round
+    param question_sent_at: time.time() when the question was sent
+    """
+    global ANSWERS
+
+    median, spread = math.log(VIRTUAL_BOT_DELAY[0]), VIRTUAL_BOT_DELAY[1]
+    bot_answers = []
+    for name in names:
+        accuracy = VIRTUAL_BOT_MODELS.get(name)
+        if accuracy is None:
+            continue
+        delay = random.lognormvariate(median, spread)
+        if delay <= ROUND_TIME:
+            bot_answers.append((delay, name, random.random() < accuracy))
+    if not bot_answers:
+        return
+    bot_answers.sort()
+    events = []
+    for delay, name, correct in bot_answers:
+        ANSWERS[str(correct)].append(name)
+        events.append((ANSWER_RECEIVED, int((question_sent_at + delay) * 1000000),
+                       (name, bank[question] if correct else not bank[question], correct)))
+    correct_count = sum(1 for _, _, correct in bot_answers if correct)
+    if correct_count:
+        update_question_data(question, True, correct_count)
+    if correct_count < len(bot_answers):
+        update_question_data(question, False, len(bot_answers) - correct_count)
+    if EVENT_LOG is not None:
+        EVENT_LOG.write_many(events)
 
 
 ############################################## Handle Game Functions ##############################################
@@ -280,25 +889,61 @@ def start_game():
     """
     global CONNECTIONS
     global NAMES
+    global GAME_ID
+    global ASKED_QUESTIONS
+    global LATENCY
 
     print_colors("Starting the game!")
-    # Shuffle the team names
-    team_msg = "Welcome to the Mystic server, where we are answering trivia questions about countries\n"
-    # Send team names to all clients
-    for name, counter in NAMES:
-        team_msg += f'Player {counter} : {name}\n'
-    # randomize the question
-    question = random.choice(list(olympics_questions.keys()))
-    team_msg += f'==\n Question: {question}'
+    GAME_ID += 1
+    ASKED_QUESTIONS = set()
+    LATENCY = {name: LATENCY[name] for name, _ in NAMES if name in LATENCY}
+    add_virtual_bots()
+    log_event(GAME_START, GAME_ID)
+    for name, _ in NAMES:
+        log_event(PLAYER_JOIN, name)
+    # select the question
+    publish_live_state(len(NAMES))
+    bank = olympics_questions
+    question = select_question(len(NAMES), bank)
+    # the welcome banner, the team names and the question, encoded once for all the players
+    payload = welcome_payload(NAMES, question)
     q_data(question)
-    print_colors(team_msg)
-    broadcast_message(team_msg)
-    for client in CONNECTIONS:
-        threading.Thread(target=get_answer, args=(question, client)).start()
-    time.sleep(10)
+    print_colors(payload.decode('utf-8'))
+    round_started_at = time.monotonic()
+    question_sent_at = time.time()
+    broadcast_message(payload, timed=True)
+    log_event(QUESTION_SENT, ROUND, question)
+    compensation = {}
+    answer_threads = []
+    for client in list(CONNECTIONS):
+        compensation[client] = latency_compensation(CON_NAME[client])
+        deadline = round_started_at + ROUND_TIME + compensation[client]
+        answer_threads.append(threading.Thread(target=get_answer, args=(question, client, bank, deadline)))
+        answer_threads[-1].start()
+    time.sleep(ROUND_TIME + max(compensation.values(), default=0))
+    wait_for_answers(answer_threads)
+    answer_virtual_bots([name for name, _ in NAMES], question, bank, question_sent_at)
     end_round()
 
 
+def resolve_round(answers):
+    """
+    Decide how the current round ends.
+    This function only looks at the ANSWERS-style dictionary, so the game server and the replay tool
+    (Replay.py) resolve rounds with exactly the same rules.
+    param answers: dictionary with the names of the players who answered correctly ('True') and incorrectly ('False')
+    returns ('winner', name) when exactly one player answered correctly, ('no_winner', None) when everybody who
+    answered was wrong, ('empty', None) when nobody answered and ('next_round', names_correct) otherwise.
+    """
+    if len(answers['True']) == 1:
+        return 'winner', answers['True'][0]
+    if len(answers['True']) == 0 and len(answers['False']) > 0:
+        return 'no_winner', None
+    if len(answers['True']) == 0 and len(answers['False']) == 0:
+        return 'empty', None
+    return 'next_round', [name for name in answers['True']]
+
+
 def end_round():
     """
     End the current round of the trivia game.
@@ -309,29 +954,28 @@ def end_round():
     global ROUND
     global ANSWERS
 
-    if len(ANSWERS['True']) == 1:
-        update_data(ANSWERS['True'][0])  # winner
-        end_game(ANSWERS['True'][0])  # end game with winner
-    if len(ANSWERS['True']) == 0 and len(ANSWERS['False']) > 0:
+    outcome, result = resolve_round(ANSWERS)
+    log_event(ROUND_RESOLVED, ROUND, len(ANSWERS['True']), len(ANSWERS['False']))
+    if outcome != 'next_round':
+        log_event(GAME_END, result or '')
+        if EVENT_LOG is not None:
+            EVENT_LOG.flush()
+    if outcome == 'winner':
+        update_data(result)  # winner
+        end_game(result)  # end game with winner
+    elif outcome == 'no_winner':
         update_data_no_winner()
         no_winner()
-    if len(ANSWERS['True']) == 0 and len(ANSWERS['False']) == 0:  # the previous condition makes empty arrays
+    if outcome != 'next_round':  # end_game() and no_winner() leave ANSWERS empty
         close_game_no_winner()
         start_therads()  # start new game
     else:
-        message = ''
-        for answer in ANSWERS.keys():
-            for name in ANSWERS[answer]:
-                if answer == 'True':
-                    message += f'{name} Is Correct!\n'
-                else:
-                    message += f'{name} Is InCorrect!\n'
-            print_colors(message)
-            broadcast_message_for_active_players(message)
-            message = ''
-        names_correct = [name for name in ANSWERS['True']]
+        payload = results_payload(ANSWERS)
+        print_colors(payload.decode('utf-8'))
+        broadcast_message_for_active_players(payload)
+        ping_players({conn: CON_NAME[conn] for conn in list(CONNECTIONS) if CON_NAME.get(conn) in result})
         ROUND += 1
-        start_round(names_correct)
+        start_round(result)
 
 
 def start_round(names_correct):
@@ -346,82 +990,134 @@ def start_round(names_correct):
     global ANSWERS
     global CONNECTIONS
 
-    team_msg = f'Round {ROUND}, played by '
-    # Send team names to all clients
-    i = 1
-    for name in names_correct:
-        if i == 1:
-            team_msg += f'{name} '
-            i += 1
-        elif i < len(NAMES):
-            team_msg += f'and {name}'
-            i += 1
-        else:
-            team_msg += f'and {name}:\n'
-    # randomize the question
-    question = random.choice(list(olympics_questions.keys()))
-    team_msg += f'\nTrue or false: {question}'
+    # select the question
+    publish_live_state(len(names_correct))
+    bank = olympics_questions
+    question = select_question(len(names_correct), bank)
+    payload = round_payload(ROUND, names_correct, question)
     q_data(question)
-    print_colors(team_msg)
-    broadcast_message_to_correct_players(team_msg)
+    print_colors(payload.decode('utf-8'))
+    round_started_at = time.monotonic()
+    question_sent_at = time.time()
+    broadcast_message_to_correct_players(payload, timed=True)
+    log_event(QUESTION_SENT, ROUND, question)
     ANSWERS['True'] = []
     ANSWERS['False'] = []
-    for client in CONNECTIONS:
+    compensation = {}
+    answer_threads = []
+    for client in list(CONNECTIONS):
         name = CON_NAME[client]
         if name in names_correct:
-            threading.Thread(target=get_answer, args=(question, client)).start()
-    time.sleep(10)
+            compensation[client] = latency_compensation(name)
+            deadline = round_started_at + ROUND_TIME + compensation[client]
+            answer_threads.append(threading.Thread(target=get_answer, args=(question, client, bank, deadline)))
+            answer_threads[-1].start()
+    if answer_threads:  # rounds played by virtual bots only don't wait
+        time.sleep(ROUND_TIME + max(compensation.values(), default=0))
+    wait_for_answers(answer_threads)
+    answer_virtual_bots(names_correct, question, bank, question_sent_at)
     end_round()
 
 
-def get_answer(question, client):
+def wait_for_answers(answer_threads):
+    """
+    Wait for the answer threads of a round to finish, so none of them outlives its round or changes ANSWERS
+    while the round is resolved. They stop at their deadline, which has passed when this is called.
+    """
+    for thread in answer_threads:
+        thread.join()
+
+
+def get_answer(question, client, bank, deadline):
     """
     Get the answer from a client.
     This function receives an answer from a client, checks its validity, and updates the
-    ANSWERS dictionary accordingly.
+    ANSWERS dictionary accordingly. Late pongs are skipped, answers after the deadline are ignored.
+    param bank: the question bank snapshot the question was taken from
+    param deadline: time.monotonic() value by which the answer must arrive, ROUND_TIME after the question was
+    sent plus the player's latency compensation
     """
     # get the answer from the client
     global CON_NAME
+    global FLOOD_STATS
 
-    client.settimeout(10)
     name = CON_NAME[client]
+    invalid_answers = 0
     try:
         while True:
-            answer = client.recv(1024).decode().strip()
-            if answer == 'T' or answer == 'Y' or answer == '1' or answer == 't' or answer == 'y':
+            client.settimeout(max(deadline - time.monotonic(), 0.001))
+            data = client.recv(1024)
+            if not data:
+                break  # the client disconnected
+            if not spend_input(client, len(data)):
+                drop_flooder(client, name)
+                return
+            _, answer = split_control_lines(data.decode('utf-8', 'replace'))
+            answer = answer.strip()
+            if time.monotonic() > deadline:
+                break
+            if not answer:
+                continue  # only control lines
+            if answer in TRUE_ANSWERS:
                 answer = True
-                check_answer(answer, question, client)
+                check_answer(answer, question, client, bank)
                 break
                 # count += 1
-            elif answer == 'F' or answer == 'N' or answer == '0' or answer == 'n' or answer == 'f':
+            elif answer in FALSE_ANSWERS:
                 answer = False
-                check_answer(answer, question, client)
+                check_answer(answer, question, client, bank)
                 break
                 # count += 1
+            elif invalid_answers < MAX_INVALID_ANSWERS:
+                invalid_answers += 1
+                client.send(INVALID_ANSWER_MESSAGE)
             else:
-                client.send('Invalid Answer!'.encode("utf-8"))
+                with LOCK:
+                    FLOOD_STATS['invalid_answers_dropped'] += 1  # no more replies, the input budget still applies
+        client.settimeout(None)
+    except socket.timeout:
+        client.settimeout(None)  # no answer in time
     except Exception as e:
-        print_colors(f'Error getting answer from {name}:')
+        print_colors(f'Error getting answer from {name}: {e}', logging.WARNING, player=name)
         client.close()
 
 
-def check_answer(answer, question, conn):
+def check_answer(answer, question, conn, bank):
     """
     This function compares the submitted answer to the correct answer for a given question.
     It updates round data based on whether the answer is correct or incorrect in ANSWERS dictionary.
     :param answer: The answer submitted by the player after converting to T/F in get_answer()
     :param question: The question for which the answer is being checked.
     :param conn:The socket connection to the player.
+    :param bank: The question bank snapshot the question was taken from.
     """
-    global ANSWERS
     global CON_NAME
 
-    if answer == olympics_questions[question]:
-        update_question_data(question, True)
-        ANSWERS['True'].append(CON_NAME[conn])
-    else:
-        update_question_data(question, False)
-        ANSWERS['False'].append(CON_NAME[conn])
+    record_answer(CON_NAME[conn], answer, question, bank)
+
+
+def record_answer(name, answer, question, bank=None, answers=None, log=log_event):
+    """
+    Record a player's answer for the current round.
+    This function checks the answer against the question bank, updates the question statistics and the
+    ANSWERS dictionary and writes the answer to the event log.
+    :param name: The name of the player.
+    :param answer: The answer submitted by the player, True or False.
+    :param question: The question for which the answer is being checked.
+    :param bank: The question bank snapshot the question was taken from, the current one by default.
+    :param answers: The ANSWERS-style dictionary to add the answer to, ANSWERS by default (heats keep their own).
+    :param log: Records the answer event like log_event() (heats collect their events and write them at once).
+    """
+    global ANSWERS
+
+    if bank is None:
+        bank = olympics_questions
+    if answers is None:
+        answers = ANSWERS
+    correct = answer == bank[question]
+    update_question_data(question, correct)
+    answers[str(correct)].append(name)
+    log(ANSWER_RECEIVED, name, answer, correct)
 
 
 def no_winner():
@@ -431,15 +1127,10 @@ def no_winner():
     """
     global ANSWERS
 
-    message = ''
-    for answer in ANSWERS.keys():
-        for name in ANSWERS[answer]:
-            message += f'{name} Is InCorrect!\n'
-        broadcast_message_for_active_players(message)
-        message = ''
-    message = f'Game Over!\nNo Winners!'
-    print_colors(message)
-    broadcast_message(message)
+    with Transport.corked(CONNECTIONS):  # the results and 'Game Over!' leave together
+        broadcast_message_for_active_players(results_payload(ANSWERS))
+        print_colors(NO_WINNER_MESSAGE.decode('utf-8'))
+        broadcast_message(NO_WINNER_MESSAGE)
     ANSWERS['True'] = []
     ANSWERS['False'] = []
     close_game()
@@ -452,19 +1143,13 @@ def end_game(winner):
     """
     global ANSWERS
 
-    message = ''
-    for answer in ANSWERS.keys():
-        for name in ANSWERS[answer]:
-            if answer == 'True':
-                message += f'{name} Is Correct! {name} Wins!\n'
-            else:
-                message += f'{name} Is InCorrect!\n'
-        print_colors(message)
-        broadcast_message_for_active_players(message)
-        message = ''
-    message = f'Game Over!\n Congratulations to the winner: {winner}'
-    print_colors(message)
-    broadcast_message(message)
+    with Transport.corked(CONNECTIONS):  # the results and 'Game Over!' leave together
+        payload = results_payload(ANSWERS, winner)
+        print_colors(payload.decode('utf-8'))
+        broadcast_message_for_active_players(payload)
+        payload = WINNER_MESSAGE % encode_name(winner)
+        print_colors(payload.decode('utf-8'))
+        broadcast_message(payload)
     ANSWERS['True'] = []
     ANSWERS['False'] = []
     close_game()
@@ -473,35 +1158,25 @@ def end_game(winner):
 def close_game():
     """
     Close the game.
-    This function closes all client connections, clears game-related variables, prints game
-    statistics, and waits for a few seconds before sending out offer requests for a new game.
+    This function closes all client connections in the background, clears game-related variables,
+    publishes the statistics for the background reporter, and waits GAME_PAUSE seconds (none by default)
+    before sending out offer requests for a new game.
     """
-    global CONNECTIONS
-    global GAME_READY_EVENT
-    global ROUND
-    global COUNTER
-    global NAMES
-    global CON_NAME
+    global GAMES_PLAYED
 
-    ROUND = 1
-    COUNTER = 0
-    for conn in CONNECTIONS:
-        conn.close()
-    GAME_READY_EVENT.clear()
-    CONNECTIONS = []
-    NAMES = []
-    CON_NAME = {}
+    GAMES_PLAYED += 1
+    close_game_no_winner()
+    publish_stats()
     print_colors("Game over,sending out offer requests...")
-    print("\n")
-    print_stats()
-    time.sleep(3)
+    if GAME_PAUSE > 0:
+        time.sleep(GAME_PAUSE)
 
 
 def close_game_no_winner():
     """
     Close the game when no winner is determined.
-    This function closes all client connections, clears game-related variables, and prepares for
-    a new game without declaring a winner.
+    This function hands all client connections to a background thread to close, clears game-related
+    variables, and prepares for a new game without declaring a winner.
     """
     global CONNECTIONS
     global GAME_READY_EVENT
@@ -509,119 +1184,462 @@ def close_game_no_winner():
     global COUNTER
     global NAMES
     global CON_NAME
+    global GAME_ENDED_AT
+    global VIRTUAL_BOT_MODELS
 
     ROUND = 1
     COUNTER = 0
-    for conn in CONNECTIONS:
-        conn.close()
+    if CONNECTIONS:
+        threading.Thread(target=close_connections, args=(CONNECTIONS,), daemon=True).start()
+        GAME_ENDED_AT = time.perf_counter()
     GAME_READY_EVENT.clear()
     CONNECTIONS = []
     NAMES = []
     CON_NAME = {}
+    VIRTUAL_BOT_MODELS = {}
+    publish_live_state()
+
+
+def close_connections(connections):
+    """
+    Close a batch of client connections, off the game thread.
+    """
+    for conn in connections:
+        INPUT_BUDGETS.pop(conn, None)
+        try:
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        conn.close()
+
+
+############################################## Tournament Functions ##############################################
+
+def start_tournament():
+    """
+    Play the lobby as a tournament.
+    The players are split into heats of at most HEAT_SIZE players that play in parallel by the normal game rules.
+    The heat winners advance to the next stage, until one player is left. With every stage dividing the field by
+    up to HEAT_SIZE, the tournament takes a number of stages logarithmic in the number of players.
+    Every heat is recorded as a game in the player statistics and the event log.
+    """
+    global LATENCY
+    global ASKED_QUESTIONS
+
+    ASKED_QUESTIONS = set()
+    LATENCY = {name: LATENCY[name] for name, _ in NAMES if name in LATENCY}
+    entrants = {conn: CON_NAME[conn] for conn in list(CONNECTIONS)}
+    print_colors(f'Starting a tournament of {len(entrants)} players!')
+    stage = 1
+    while len(entrants) > 1:
+        heats = split_into_heats(entrants)
+        results = [None] * len(heats)
+        heat_threads = [threading.Thread(target=run_heat, args=(stage, number, heat, results))
+                        for number, heat in enumerate(heats)]
+        for thread in heat_threads:
+            thread.start()
+        for thread in heat_threads:
+            thread.join()
+        entrants = {}
+        for names, winner, winner_conn in results:
+            record_game(names, winner)
+            if winner is not None:
+                entrants[winner_conn] = winner
+        message = f'Stage {stage} is over, {len(entrants)} players advance'
+        if len(entrants) <= HEAT_SIZE:
+            message += ': ' + ', '.join(entrants.values())
+        print_colors(message)
+        broadcast_message(f'{message}\n'.encode('utf-8'))
+        stage += 1
+
+    champion = next(iter(entrants.values()), None)
+    payload = NO_WINNER_MESSAGE if champion is None else TOURNAMENT_WINNER_MESSAGE % encode_name(champion)
+    print_colors(payload.decode('utf-8'))
+    broadcast_message(payload)
+    if EVENT_LOG is not None:
+        EVENT_LOG.flush()
+    close_game()
+    start_therads()  # start new game
+
+
+def split_into_heats(entrants):
+    """
+    Split the players of a stage into the fewest heats of at most HEAT_SIZE players, with sizes as even as possible.
+    param entrants: dictionary of connection to player name
+    returns a list of such dictionaries, one per heat
+    """
+    players = list(entrants.items())
+    random.shuffle(players)
+    heats = -(-len(players) // HEAT_SIZE)
+    return [dict(players[number::heats]) for number in range(heats)]
+
+
+def run_heat(stage, number, players, results):
+    """
+    Play one heat of a tournament stage, by the same rules as a game (resolve_round()).
+    The answers of all the players of the heat are collected by this thread (collect_answers()), and its events are
+    written to the event log in one batch when it ends, so heats running in parallel don't interleave their games.
+    param players: dictionary of connection to player name
+    param results: results[number] is set to (player names, winner name or None, winner connection or None)
+    """
+    global GAME_ID
+
+    results[number] = (list(players.values()), None, None)  # in case the heat fails
+    events = []
+
+    def log(event_type, *fields):
+        events.append((event_type, time.time_ns() // 1000, fields))
+
+    with LOCK:
+        GAME_ID += 1
+        game_id = GAME_ID
+    log(GAME_START, game_id)
+    for name in players.values():
+        log(PLAYER_JOIN, name)
+    alive = dict(players)
+    round_number = 1
+    asked = set()  # questions asked in this heat
+    while True:
+        HEATS[(stage, number)] = {'game_id': game_id, 'stage': stage, 'heat': number + 1, 'round': round_number,
+                                  'players': len(players), 'alive': len(alive)}
+        publish_live_state()
+        bank = olympics_questions
+        question = select_question(len(alive), bank, round_number, asked)
+        payload = round_payload(round_number, alive.values(), question, heat=(stage, number + 1))
+        if stage == 1 and round_number == 1:
+            payload = TOURNAMENT_BANNER + payload
+        q_data(question)
+        round_started_at = time.monotonic()
+        broadcast_message(payload, timed=True, connections=alive)
+        log(QUESTION_SENT, round_number, question)
+        answers = collect_answers(alive, question, bank, round_started_at, log)
+        outcome, result = resolve_round(answers)
+        log(ROUND_RESOLVED, round_number, len(answers['True']), len(answers['False']))
+        answered = set(answers['True']) | set(answers['False'])
+        broadcast_message(results_payload(answers), connections=[conn for conn, name in alive.items() if name in answered])
+        if outcome != 'next_round':
+            break
+        alive = {conn: name for conn, name in alive.items() if name in result}
+        ping_players(alive)
+        round_number += 1
+
+    winner = result if outcome == 'winner' else None
+    log(GAME_END, winner or '')
+    if EVENT_LOG is not None:
+        EVENT_LOG.write_many(events)
+    HEATS.pop((stage, number), None)
+    results[number] = (list(players.values()), winner,
+                       next((conn for conn, name in alive.items() if name == winner), None))
+
+
+def collect_answers(players, question, bank, round_started_at, log):
+    """
+    Collect the answers of the players of a heat in one thread.
+    This function waits for all the connections at once with a selector until every player answered or reached
+    their deadline (ROUND_TIME plus their latency compensation), with the same input rules as get_answer().
+    param players: dictionary of connection to player name
+    param log: records the answer events like log_event()
+    returns the ANSWERS-style dictionary of the round, correct answers in the order they arrived
+    """
+    global FLOOD_STATS
+
+    answers = {'True': [], 'False': []}
+    deadlines = {conn: round_started_at + ROUND_TIME + latency_compensation(name)
+                 for conn, name in players.items() if conn.fileno() != -1}
+    invalid_answers = {}
+    with selectors.DefaultSelector() as selector:
+        for conn in deadlines:
+            selector.register(conn, selectors.EVENT_READ)
+
+        def done(conn):
+            selector.unregister(conn)
+            deadlines.pop(conn)
+
+        while deadlines:
+            now = time.monotonic()
+            for conn in [conn for conn, deadline in deadlines.items() if deadline <= now]:
+                done(conn)
+            if not deadlines:
+                break
+            for key, _ in selector.select(min(deadlines.values()) - now):
+                conn = key.fileobj
+                name = players[conn]
+                try:
+                    data = conn.recv(1024)
+                except OSError:
+                    data = b''
+                if not data or not spend_input(conn, len(data)):
+                    done(conn)
+                    if data:
+                        drop_flooder(conn, name)
+                    continue
+                _, answer = split_control_lines(data.decode('utf-8', 'replace'))
+                answer = answer.strip()
+                if not answer:
+                    continue  # only control lines
+                if answer in TRUE_ANSWERS or answer in FALSE_ANSWERS:
+                    record_answer(name, answer in TRUE_ANSWERS, question, bank, answers, log)
+                    done(conn)
+                elif invalid_answers.get(conn, 0) < MAX_INVALID_ANSWERS:
+                    invalid_answers[conn] = invalid_answers.get(conn, 0) + 1
+                    try:
+                        conn.send(INVALID_ANSWER_MESSAGE)
+                    except OSError:
+                        done(conn)
+                else:
+                    with LOCK:
+                        FLOOD_STATS['invalid_answers_dropped'] += 1
+    return answers
+
+
+############################################## Message Payload Functions ##############################################
+
+@functools.lru_cache(maxsize=4096)
+def encode_name(name):
+    """
+    The encoded player name, cached: a player's name goes into several payloads every round.
+    """
+    return name.encode('utf-8')
+
+
+def question_bytes(question):
+    """
+    The encoded question, from QUESTION_BYTES (a question of a bank replaced by a reload is encoded on the spot).
+    """
+    encoded = QUESTION_BYTES.get(question)
+    return encoded if encoded is not None else question.encode('utf-8')
+
+
+def welcome_payload(names, question):
+    """
+    The first message of a game: the welcome banner, the players and the first question.
+    param names: the (name, player number) pairs of NAMES
+    """
+    parts = [WELCOME_BANNER]
+    parts.extend(PLAYER_LINE % (counter, encode_name(name)) for name, counter in names)
+    parts.append(WELCOME_PROMPT)
+    parts.append(question_bytes(question))
+    return b''.join(parts)
+
+
+def round_payload(round_number, names, question, heat=None):
+    """
+    The question of a round after the first: 'Round <n>, played by <names>:' followed by the question.
+    param heat: (stage, heat number) for the rounds of a tournament heat
+    """
+    if heat is None:
+        header = ROUND_HEADER % round_number
+    else:
+        header = HEAT_ROUND_HEADER % (round_number, heat[1], heat[0])
+    return b''.join((header, b' and '.join(map(encode_name, names)), ROUND_PROMPT, question_bytes(question)))
+
+
+def results_payload(answers, winner=None):
+    """
+    The results of a round, one line per player who answered, correct answers first.
+    param answers: the ANSWERS-style dictionary of the round
+    param winner: the player who won the game with this round, if any
+    """
+    parts = [WINNER_LINE % (encode_name(name), encode_name(name)) if name == winner
+             else CORRECT_LINE % encode_name(name) for name in answers['True']]
+    parts.extend(INCORRECT_LINE % encode_name(name) for name in answers['False'])
+    return b''.join(parts)
 
 
 ############################################## Broadcast messages Functions ##############################################
 
-def broadcast_message_for_active_players(message):
+def timed_payload(name, payload, framed):
+    """
+    The payload prefixed with the player's '#TIMER' line.
+    Almost every player gets the same line (the full ROUND_TIME), so each distinct line is joined to the payload
+    once per broadcast and the bytes are shared by all the players who get that line.
+    param framed: dictionary of '#TIMER' line to the joined bytes, one per broadcast
+    """
+    line = timer_line(name)
+    data = framed.get(line)
+    if data is None:
+        data = framed[line] = line + payload
+    return data
+
+
+def broadcast_message_for_active_players(payload):
     """
     Broadcast a message to active players who have submitted answers.
     This function broadcasts a message to all active players who have submitted answers during the current round.
+    param payload: the encoded message, the same bytes are sent to every player
     """
     global CONNECTIONS
     global CON_NAME
 
-    for conn in CONNECTIONS:
-        if CON_NAME[conn] in ANSWERS['True'] or CON_NAME[conn] in ANSWERS['False']:
+    for conn in list(CONNECTIONS):  # a copy, connections that fail are removed from CONNECTIONS
+        name = CON_NAME.get(conn)
+        if name in ANSWERS['True'] or name in ANSWERS['False']:
             try:
-                conn.send(message.encode('utf-8'))
+                conn.send(payload)
             except Exception as e:
-                print_colors(f'Error broadcasting message to {CON_NAME[conn]}: {e}')
-                CONNECTIONS.remove(conn)
-                CON_NAME.pop(conn)
-                conn.close()
+                print_colors(f'Error broadcasting message to {name}: {e}', logging.WARNING, player=name)
+                drop_connection(conn)
 
 
-def broadcast_message_to_correct_players(message):
+def broadcast_message_to_correct_players(payload, timed=False):
     """
     Broadcast a message to players who have submitted correct answers in the previous round and continue
     to the next round(used in start_round())
+    param payload: the encoded message, the same bytes are sent to every player
+    param timed: prefix the message with the player's '#TIMER' line (for questions), see timed_payload()
     """
     global CONNECTIONS
     global CON_NAME
 
-    for conn in CONNECTIONS:
-        if CON_NAME[conn] in ANSWERS['True']:
+    framed = {}
+    for conn in list(CONNECTIONS):  # a copy, connections that fail are removed from CONNECTIONS
+        name = CON_NAME.get(conn)
+        if name in ANSWERS['True']:
             try:
-                conn.send(message.encode('utf-8'))
+                conn.send(timed_payload(name, payload, framed) if timed else payload)
             except Exception as e:
-                print_colors(f'Error broadcasting message to {CON_NAME[conn]}: {e}')
-                CONNECTIONS.remove(conn)
-                CON_NAME.pop(conn)
-                conn.close()
+                print_colors(f'Error broadcasting message to {name}: {e}', logging.WARNING, player=name)
+                drop_connection(conn)
 
 
-def broadcast_message(message):
+def broadcast_message(payload, timed=False, connections=None):
     """
     Broadcast a message to all connected players.
     This function sends a message to all players who are currently connected to the server.
+    param payload: the encoded message, the same bytes are sent to every player
+    param timed: prefix the message with the player's '#TIMER' line (for questions), see timed_payload()
+    param connections: send to these players only (the players of a heat)
     """
     global CONNECTIONS
     global CON_NAME
 
-    for conn in CONNECTIONS:
+    framed = {}
+    for conn in list(CONNECTIONS if connections is None else connections):  # a copy, connections that fail are removed
+        name = CON_NAME.get(conn)
         try:
-            conn.send(message.encode('utf-8'))
+            conn.send(timed_payload(name, payload, framed) if timed else payload)
         except Exception as e:
-            print_colors(f'Error broadcasting message to {CON_NAME[conn]}: {e}')
-            CONNECTIONS.remove(conn)
-            CON_NAME.pop(conn)
-            conn.close()
+            print_colors(f'Error broadcasting message to {name}: {e}', logging.WARNING, player=name)
+            drop_connection(conn)
 
 
 ############################################## Handle Clients Functions ##############################################
-def handle_client(conn, addr):
+def handle_client(conn, addr, deadline):
     """
     Handle a client connection.
-    This function is responsible for handling a client connection to the server.
-    It receives the player's name, assigns a unique identifier to the player,
-    and waits for the game to start.
+    This function is responsible for the handshake of a new client connection.
+    It receives the player's name before the handshake deadline, assigns a unique identifier to the player,
+    and admits the player to the lobby if the room still has space and the game has not started yet.
+    param deadline: time.monotonic() value by which the player's name must arrive
     """
     global COUNTER
-    global GAME_READY_EVENT
     global NAMES
     global CON_NAME
+    global CONNECTIONS
+    global PENDING_HANDSHAKES
+    global LAST_ADMITTED_AT
 
-    conn.settimeout(10)
     try:
+        conn.settimeout(max(deadline - time.monotonic(), 0.001))
         # receive player name
-        name = conn.recv(1024).decode().strip()
+        name = conn.recv(1024).decode('utf-8', 'replace').strip()
+        if not valid_name(name):
+            with LOCK:
+                ADMISSION_STATS['rejected_bad_name'] += 1
+            conn.send('Invalid Name!'.encode('utf-8'))
+            drop_connection(conn)
+            return
         # if name not start with 'BOT:', add the player to the game
         if name.startswith('BOT: '):
             name = f'{name}_{generate_bot_name()}'
         else:
             name = f'{name}_{addr[0]}'
-        COUNTER += 1
-        NAMES.append((name, COUNTER))
-        CON_NAME[conn] = name
-        GAME_READY_EVENT.wait()
+        for _ in range(LOBBY_PINGS):
+            ping_players({conn: name})
+        if conn.fileno() == -1:
+            return  # dropped for flooding during the pings
+        with LOCK:
+            if GAME_READY_EVENT.is_set():
+                reason = 'rejected_game_started'
+            elif len(CONNECTIONS) >= MAX_PLAYERS_PER_ROOM:
+                reason = 'rejected_room_full'
+            else:
+                reason = None
+                COUNTER += 1
+                NAMES.append((name, COUNTER))
+                CON_NAME[conn] = name
+                CONNECTIONS.append(conn)
+                ADMISSION_STATS['accepted'] += 1
+                LAST_ADMITTED_AT = time.monotonic()
+        if reason is not None:
+            reject_client(conn, reason)
+        else:
+            publish_live_state()
 
+    except socket.timeout:
+        reject_client(conn, 'rejected_handshake_deadline', HANDSHAKE_TIMEOUT_MESSAGE.format(HANDSHAKE_DEADLINE))
     except Exception as e:
-        print_colors(f'Error handling client {addr}: {e}')
-        CONNECTIONS.remove(conn)
+        print_colors(f'Error handling client {addr}: {e}', logging.WARNING, address=addr[0])
+        with LOCK:
+            INPUT_BUDGETS.pop(conn, None)
         conn.close()
+    finally:
+        with LOCK:
+            PENDING_HANDSHAKES -= 1
+        HANDSHAKE_SLOTS.release()
+
+
+def reject_client(conn, reason, message=None):
+    """
+    Reject a client that cannot be admitted.
+    This function tells the client why (by default, that the server is full and when to try again), counts the
+    rejection and closes the connection.
+    param reason: the ADMISSION_STATS counter to increment
+    param message: the reply to send instead of SERVER_FULL_MESSAGE
+    """
+    global ADMISSION_STATS
+
+    if message is None:
+        message = SERVER_FULL_MESSAGE.format(RETRY_AFTER)
+    with LOCK:
+        ADMISSION_STATS[reason] += 1
+        INPUT_BUDGETS.pop(conn, None)  # the lobby pings may have given it a budget
+    try:
+        conn.settimeout(1)
+        conn.send(message.encode('utf-8'))
+    except Exception:
+        pass
+    conn.close()
 
 
 def client_connected():
     """
     Accept a new client connection.
-    This function accepts a new client connection and starts a thread to handle it.
+    This function accepts a new client connection and, if the server has room for it and a handshake slot
+    is free, starts a thread to handle its handshake. Otherwise the client is rejected right away.
     """
     global CONNECTIONS
     global TCP_SOCKET
+    global PENDING_HANDSHAKES
 
     conn, addr = TCP_SOCKET.accept()
-    CONNECTIONS.append(conn)
-    threading.Thread(target=handle_client, args=(conn, addr)).start()  # handle player
+    Transport.apply_profile(conn, TRANSPORT_PROFILE)  # not every system copies the options of the listening socket
+    with LOCK:
+        if len(CONNECTIONS) + PENDING_HANDSHAKES >= MAX_PLAYERS_PER_SERVER:
+            reason = 'rejected_server_full'
+        elif len(CONNECTIONS) >= MAX_PLAYERS_PER_ROOM:
+            reason = 'rejected_room_full'
+        else:
+            reason = None
+    if reason is None and not HANDSHAKE_SLOTS.acquire(blocking=False):
+        reason = 'rejected_handshake_queue_full'
+    if reason is not None:
+        reject_client(conn, reason)
+        return
+    with LOCK:
+        PENDING_HANDSHAKES += 1
+    deadline = time.monotonic() + HANDSHAKE_DEADLINE
+    threading.Thread(target=handle_client, args=(conn, addr, deadline)).start()  # handle player handshake
 
 
 def tcp_server():
@@ -637,20 +1655,25 @@ def tcp_server():
     global GAME_READY_EVENT
 
     while True:
+        with LOCK:
+            players, pending, last_admitted_at = len(NAMES), PENDING_HANDSHAKES, LAST_ADMITTED_AT
+            room_full = len(CONNECTIONS) >= MAX_PLAYERS_PER_ROOM
+        # only admitted players restart the lobby timer, rejected clients retrying don't hold the game back
+        if players and (room_full or time.monotonic() - last_admitted_at >= LOBBY_WAIT):
+            break
+        # handshakes finish in their own threads, so check the lobby again soon while anyone is waiting
+        TCP_SOCKET.settimeout(LOBBY_POLL_INTERVAL if players or pending else None)
         try:
             client_connected()
-            TCP_SOCKET.settimeout(10)  # will go the except , 10 sec from the last player- no conn for 10 sec
         except socket.timeout:
-            if len(CONNECTIONS) == 0:
-                continue  # search players
-            break
+            pass
 
-    if len(NAMES) >= 1:
-        TCP_SOCKET.settimeout(None)
-        GAME_READY_EVENT.set()  # start game , flag is set
-        start_game()
+    TCP_SOCKET.settimeout(None)
+    GAME_READY_EVENT.set()  # start game , flag is set
+    if TOURNAMENT_MODE and len(NAMES) > HEAT_SIZE:
+        start_tournament()
     else:
-        tcp_server()
+        start_game()
 
 
 def broadcast_udp():
@@ -660,14 +1683,16 @@ def broadcast_udp():
     """
     global UDP_SOCKET
 
-    message = MAGIC_COOKIE + OFFER_MESSAGE_TYPE + SERVER_NAME.encode().ljust(32) + TCP_PORT.to_bytes(2, 'big')
+    message = Discovery.build_offer(SERVER_NAME, TCP_PORT)
     while not GAME_READY_EVENT.is_set():  # until game is started- changed in  tcp_server()
         try:
             number = '255.255.255.255'
             UDP_SOCKET.sendto(message, (
             number, UDP_PORT))  # continue to send connection request every second until game is started
+            if Discovery.MULTICAST_GROUP is not None:
+                UDP_SOCKET.sendto(message, (Discovery.MULTICAST_GROUP, UDP_PORT))
         except Exception as e:
-            print_colors(f'Error broadcasting UDP message: {e}')
+            print_colors(f'Error broadcasting UDP message: {e}', logging.ERROR)
         time.sleep(1)
 
     ############################################## Setup Connections Functions ##############################################
@@ -684,15 +1709,16 @@ def tcp_setup():
 
     TCP_PORT = find_free_port(1025, 65535)
     TCP_SOCKET = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    Transport.apply_profile(TCP_SOCKET, TRANSPORT_PROFILE)  # before listen(), so connections start with its buffers
     try:
         TCP_SOCKET.bind((IP_ADDRESS, TCP_PORT))
     except Exception as e:
-        print_colors(f"Error binding TCP socket to IP address {IP_ADDRESS}, port {TCP_PORT}")
+        print_colors(f"Error binding TCP socket to IP address {IP_ADDRESS}, port {TCP_PORT}", logging.ERROR)
         exit()
     try:
-        TCP_SOCKET.listen(10)
+        TCP_SOCKET.listen(TCP_BACKLOG)
     except Exception as e:
-        print_colors("Error listening for incoming connections")
+        print_colors("Error listening for incoming connections", logging.ERROR)
         exit()
     print_colors(f"TCP Server started, listening on IP address {IP_ADDRESS}, port {TCP_PORT}")
 
@@ -707,12 +1733,12 @@ def udp_setup():
     try:
         UDP_SOCKET = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     except Exception as e:
-        print_colors(f"Error creating UDP socket: {e}")
+        print_colors(f"Error creating UDP socket: {e}", logging.ERROR)
         exit()
     try:
         UDP_SOCKET.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     except Exception as e:
-        print_colors(f"Error enabling broadcast for UDP socket: {e}")
+        print_colors(f"Error enabling broadcast for UDP socket: {e}", logging.ERROR)
         exit()
 
 
@@ -720,19 +1746,57 @@ def start_therads():
     """
     Start the UDP broadcasting and TCP server threads.
     """
+    global LAST_TURNOVER
+
+    if GAME_ENDED_AT is not None:
+        LAST_TURNOVER = time.perf_counter() - GAME_ENDED_AT
     threading.Thread(target=broadcast_udp).start()
     threading.Thread(target=tcp_server).start()
 
 
+def admin_console():
+    """
+    Read admin commands from the standard input until it is closed.
+    'reload' reloads the question bank from QUESTIONS_FILE (like sending SIGHUP to the server).
+    """
+    for line in sys.stdin:
+        command = line.strip().lower()
+        if command == 'reload':
+            request_reload()
+        elif command:
+            print_colors(f'Unknown command: {command}')
+
+
 ############################################## Main Function ##############################################
 def main():
     global IP_ADDRESS
+    global EVENT_LOG
+    global PLAYER_STORE
 
     IP_ADDRESS = get_local_ip()
+    build_difficulty_index(olympics_questions)
+    if PLAYER_STORE_FILE is not None:
+        PLAYER_STORE = PlayerStats.PlayerStore(PLAYER_STORE_FILE)
+    if EVENT_LOG_FILE is not None:
+        EVENT_LOG = EventLog.EventLog(EVENT_LOG_FILE, EVENT_LOG_MAX_BYTES, EVENT_LOG_BACKUPS)
+    if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, request_reload)
     tcp_setup()
     udp_setup()
+    threading.Thread(target=stats_reporter, daemon=True).start()
+    publish_stats()
+    publish_live_state()
+    if ADMIN_PORT is not None:
+        try:
+            admin = Admin.start_admin_server(ADMIN_HOST, ADMIN_PORT, lambda: ADMIN_SNAPSHOTS, request_reload)
+        except OSError as e:  # another server on this computer has the port
+            print_colors(f"Admin API port {ADMIN_PORT} unavailable ({e}), using a free port", logging.WARNING)
+            admin = Admin.start_admin_server(ADMIN_HOST, 0, lambda: ADMIN_SNAPSHOTS, request_reload)
+        print_colors(f"Admin API listening on http://{ADMIN_HOST}:{admin.server_address[1]}")
     start_therads()
 
 
 if __name__ == '__main__':
     main()
+    admin_console()
+    threading.Event().wait()  # keep the main thread alive so SIGHUP still reloads the question bank
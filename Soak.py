@@ -0,0 +1,204 @@
+############################################## Imports ##############################################
+import argparse
+import logging
+import os
+import random
+import socket
+import statistics
+import threading
+import time
+import tracemalloc
+import Logger
+import Server
+
+LOGGER = logging.getLogger('trivia.soak')
+# (name in the report, unit, scale from the sampled value to the unit)
+METRICS = {'threads': ('threads', 1), 'fds': ('fds', 1), 'rss': ('MB', 1024 * 1024), 'traced': ('MB', 1024 * 1024)}
+IGNORED_FILES = (tracemalloc.__file__, '<frozen importlib._bootstrap>', '<frozen importlib._bootstrap_external>',
+                 '<unknown>')
+
+
+def print_colors(message, level=logging.INFO):
+    """
+    Log a soak test message, shown in color on a terminal.
+    """
+    LOGGER.log(level, message, extra={'color': '\033[1;33m'})
+
+
+############################################## Simulated Players ##############################################
+def simulated_player(name, stop):
+    """
+    Play game after game against the server until the soak test stops.
+    The player answers pings and questions like Bot.py (a random answer), and joins the next lobby after a
+    short random pause when a game is over.
+    """
+    while not stop.is_set():
+        try:
+            conn = socket.create_connection((Server.IP_ADDRESS, Server.TCP_PORT), timeout=60)
+        except OSError:
+            time.sleep(1)
+            continue
+        try:
+            conn.send(name.encode('utf-8'))
+            while not stop.is_set():
+                data = conn.recv(4096)
+                if not data:
+                    break
+                text = []
+                for line in data.decode('utf-8', 'replace').split('\n'):
+                    if line.startswith('#PING'):
+                        now = time.time()
+                        conn.send(f'#PONG {line.split()[1]} {now:.6f} {now:.6f}\n'.encode('utf-8'))
+                    elif not line.startswith('#'):
+                        text.append(line)
+                text = '\n'.join(text)
+                if 'Welcome' in text or 'Round' in text:
+                    conn.send(random.choice('TF').encode('utf-8'))
+                if 'Game Over!' in text or 'Server Full!' in text:
+                    break
+        except OSError:
+            pass
+        finally:
+            conn.close()
+        time.sleep(random.uniform(0.1, 1))
+
+
+############################################## Sampling Functions ##############################################
+def sample():
+    """
+    Measure the process: live threads, open file descriptors, resident memory and memory traced by tracemalloc.
+    File descriptors and resident memory are read from /proc and are None where it doesn't exist.
+    """
+    try:
+        fds = len(os.listdir('/proc/self/fd'))
+    except OSError:
+        fds = None
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        rss = None
+    return {'threads': threading.active_count(), 'fds': fds, 'rss': rss, 'traced': tracemalloc.get_traced_memory()[0]}
+
+
+def take_snapshot():
+    """
+    A tracemalloc snapshot without the allocations of tracemalloc itself and of the import machinery.
+    """
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, path) for path in IGNORED_FILES])
+
+
+def slope_per_hour(samples, metric):
+    """
+    Least-squares growth of a metric per hour over the samples, None if it can't be measured.
+    """
+    points = [(sample['elapsed'], sample[metric]) for sample in samples if sample[metric] is not None]
+    if len(points) < 2 or len({elapsed for elapsed, _ in points}) < 2:
+        return None
+    slope, _ = statistics.linear_regression([elapsed for elapsed, _ in points], [value for _, value in points])
+    return slope * 3600
+
+
+############################################## Report Functions ##############################################
+def build_report(samples, slopes, limits, baseline, final, top, duration):
+    """
+    The soak test report: the verdict per metric, the samples and the call sites whose allocations grew the most
+    between the first snapshot after the warm-up and the last one.
+    returns the report lines and whether every metric stayed within its limit
+    """
+    passed = True
+    lines = [f'Soak test: {duration / 3600:.2f} hours, {Server.GAMES_PLAYED} games, {len(samples)} samples', '',
+             'Growth per hour:']
+    for metric, (unit, scale) in METRICS.items():
+        slope = slopes[metric]
+        if slope is None:
+            lines.append(f'  {metric:8} not measured')
+            continue
+        ok = slope / scale <= limits[metric]
+        passed = passed and ok
+        lines.append(f'  {metric:8} {slope / scale:+10.3f} {unit}/h (limit {limits[metric]:g}) '
+                     f'{"OK" if ok else "FAILED"}')
+
+    lines += ['', 'Samples (seconds, threads, fds, rss MB, traced MB):']
+    for sample in samples:
+        lines.append(f'  {sample["elapsed"]:8.0f} {sample["threads"]:6} {sample["fds"] if sample["fds"] is not None else "-":>6} '
+                     f'{sample["rss"] / 1024 / 1024 if sample["rss"] is not None else 0:8.1f} '
+                     f'{sample["traced"] / 1024 / 1024:8.1f}')
+
+    lines += ['', f'Top {top} allocation sites by growth:']
+    for stat in final.compare_to(baseline, 'traceback')[:top]:
+        lines.append(f'  {stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8} blocks '
+                     f'(now {stat.size / 1024:.1f} KiB in {stat.count} blocks)')
+        for frame in reversed(stat.traceback):  # the allocating line first
+            lines.append(f'      {frame.filename}:{frame.lineno}')
+    return lines, passed
+
+
+############################################## Main Function ##############################################
+def main():
+    parser = argparse.ArgumentParser(description='Run the server with simulated players for hours and check that '
+                                                 'threads, file descriptors and memory stop growing.')
+    parser.add_argument('--duration', type=float, default=4 * 3600, help='seconds to run')
+    parser.add_argument('--players', type=int, default=20, help='simulated players')
+    parser.add_argument('--interval', type=float, default=60, help='seconds between samples')
+    parser.add_argument('--warmup', type=float, default=600,
+                        help='seconds before the first sample (caches and pools fill up)')
+    parser.add_argument('--round-time', type=float, default=2, help='seconds to answer a question')
+    parser.add_argument('--lobby-wait', type=float, default=1, help='seconds the lobby waits for more players')
+    parser.add_argument('--max-threads-slope', type=float, default=1, help='threads per hour')
+    parser.add_argument('--max-fds-slope', type=float, default=1, help='file descriptors per hour')
+    parser.add_argument('--max-rss-slope', type=float, default=5, help='MB of resident memory per hour')
+    parser.add_argument('--max-traced-slope', type=float, default=2, help='MB of traced allocations per hour')
+    parser.add_argument('--frames', type=int, default=8, help='stack frames tracemalloc keeps per allocation')
+    parser.add_argument('--top', type=int, default=10, help='allocation sites in the report')
+    parser.add_argument('--report', default='soak_report.txt', help='file to write the report to')
+    parser.add_argument('--server-log-level', default='WARNING', help='log level of the server during the test')
+    args = parser.parse_args()
+    limits = {'threads': args.max_threads_slope, 'fds': args.max_fds_slope, 'rss': args.max_rss_slope,
+              'traced': args.max_traced_slope}
+
+    Logger.setup_logging(LOGGER, fmt=Server.LOG_FORMAT)
+    Server.LOGGER.setLevel(args.server_log_level)
+    Server.ROUND_TIME = args.round_time
+    Server.LOBBY_WAIT = args.lobby_wait
+    Server.ADMIN_PORT = None
+    Server.EVENT_LOG_FILE = None  # the event log grows by design
+    Server.PLAYER_STORE_FILE = None
+    tracemalloc.start(args.frames)
+    threading.Thread(target=Server.main, daemon=True).start()
+    while not Server.TCP_PORT:
+        time.sleep(0.1)
+
+    stop = threading.Event()
+    for number in range(args.players):
+        threading.Thread(target=simulated_player, args=(f'soak{number}', stop), daemon=True).start()
+    print_colors(f'Soak test started: {args.players} players for {args.duration:.0f} seconds')
+
+    started_at = time.monotonic()
+    time.sleep(min(args.warmup, args.duration))
+    samples = []
+    baseline = take_snapshot()
+    while True:
+        elapsed = time.monotonic() - started_at
+        samples.append({'elapsed': elapsed, **sample()})
+        print_colors(f'{elapsed:.0f}s: {Server.GAMES_PLAYED} games, ' +
+                     ', '.join(f'{metric} {value}' for metric, value in samples[-1].items() if metric != 'elapsed'))
+        if elapsed + args.interval > args.duration:
+            break
+        time.sleep(args.interval)
+    final = take_snapshot()
+    stop.set()
+
+    slopes = {metric: slope_per_hour(samples, metric) for metric in METRICS}
+    lines, passed = build_report(samples, slopes, limits, baseline, final, args.top, time.monotonic() - started_at)
+    with open(args.report, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print_colors('\n'.join(lines[:len(METRICS) + 3]), logging.INFO if passed else logging.ERROR)
+    print_colors(f'Soak test {"passed" if passed else "FAILED"}, report written to {args.report}',
+                 logging.INFO if passed else logging.ERROR)
+    Logger.stop_listeners()
+    os._exit(0 if passed else 1)  # the server threads never return
+
+
+if __name__ == '__main__':
+    main()
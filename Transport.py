@@ -0,0 +1,90 @@
+############################################## Imports ##############################################
+import collections
+import contextlib
+import socket
+
+# socket options of a transport profile, None leaves the system default
+# nodelay: send small messages at once instead of waiting for the previous segment to be acknowledged (Nagle)
+# send_buffer, receive_buffer: SO_SNDBUF and SO_RCVBUF in bytes
+# keepalive: (idle seconds before the first probe, seconds between probes, unanswered probes before the peer is dead)
+# user_timeout: milliseconds sent data may stay unacknowledged before the connection is dropped (TCP_USER_TIMEOUT)
+Profile = collections.namedtuple('Profile', 'nodelay send_buffer receive_buffer keepalive user_timeout',
+                                 defaults=(None, None, None, None, None))
+
+PROFILES = {
+    # players on the same network: small round trips, a silent peer is dead after about 8 seconds
+    'lan': Profile(nodelay=True, send_buffer=64 * 1024, receive_buffer=16 * 1024, keepalive=(5, 1, 3),
+                   user_timeout=8000),
+    # players over the internet: room for a longer round trip and its losses, a peer is dead after about 40 seconds
+    'wan': Profile(nodelay=True, send_buffer=256 * 1024, receive_buffer=64 * 1024, keepalive=(20, 5, 4),
+                   user_timeout=40000),
+    # many local connections in a benchmark: no probes or timers, which only add noise
+    'loopback_bench': Profile(nodelay=True),
+    # the options the sockets had before profiles existed, for comparison
+    'system': Profile(),
+}
+PROFILE = 'lan'  # the profile of new sockets, unless another one is named
+
+
+############################################## Profile Functions ##############################################
+def set_options(sock, options):
+    """
+    Set socket options, skipping the ones this platform doesn't have (the keepalive timers and TCP_USER_TIMEOUT
+    are Linux names) and the ones the socket refuses (a connection reset before its options were set).
+    param options: (level, option name in the socket module, value) tuples
+    returns the names of the options that were set
+    """
+    applied = []
+    for level, name, value in options:
+        option = getattr(socket, name, None)
+        if option is None:
+            continue
+        try:
+            sock.setsockopt(level, option, value)
+        except OSError:
+            continue
+        applied.append(name)
+    return applied
+
+
+def apply_profile(sock, profile=None):
+    """
+    Set the options of a transport profile on a TCP socket.
+    Buffer sizes should be set before connect() or listen(), so the window is negotiated with them: set the
+    profile on the listening socket too, accepted connections inherit its options on most systems.
+    param profile: a name in PROFILES, PROFILE by default
+    returns the names of the options that were set
+    """
+    settings = PROFILES[profile or PROFILE]
+    options = []
+    if settings.nodelay is not None:
+        options.append((socket.IPPROTO_TCP, 'TCP_NODELAY', int(settings.nodelay)))
+    if settings.send_buffer is not None:
+        options.append((socket.SOL_SOCKET, 'SO_SNDBUF', settings.send_buffer))
+    if settings.receive_buffer is not None:
+        options.append((socket.SOL_SOCKET, 'SO_RCVBUF', settings.receive_buffer))
+    if settings.keepalive is not None:
+        idle, interval, count = settings.keepalive
+        options += [(socket.SOL_SOCKET, 'SO_KEEPALIVE', 1), (socket.IPPROTO_TCP, 'TCP_KEEPIDLE', idle),
+                    (socket.IPPROTO_TCP, 'TCP_KEEPINTVL', interval), (socket.IPPROTO_TCP, 'TCP_KEEPCNT', count)]
+    if settings.user_timeout is not None:
+        options.append((socket.IPPROTO_TCP, 'TCP_USER_TIMEOUT', settings.user_timeout))
+    return set_options(sock, options)
+
+
+@contextlib.contextmanager
+def corked(connections):
+    """
+    Hold back the partial segments of several sends to each connection, and send what's left when the block ends.
+    Messages sent one after the other (the results of a round and 'Game Over!') leave in as few segments as
+    possible even with Nagle off. Where TCP_CORK doesn't exist this does nothing.
+    param connections: the sockets to cork, closed ones are skipped
+    """
+    connections = list(connections)
+    for conn in connections:
+        set_options(conn, [(socket.IPPROTO_TCP, 'TCP_CORK', 1)])
+    try:
+        yield
+    finally:
+        for conn in connections:
+            set_options(conn, [(socket.IPPROTO_TCP, 'TCP_CORK', 0)])